@@ -1,5 +1,5 @@
 from serious_run import *
-from hyperopt import space_eval
+from hyperopt import hp,space_eval
 def generate_h_param_space(dataset):
     d_x = dataset_d_x[dataset]
     w_x = dataset_w_x[dataset]
@@ -0,0 +1,95 @@
+import argparse
+import multiprocessing
+import resource
+import time
+import pandas as pd
+import torch
+from nets.nets import *
+from utils.dataloaders import get_dataloader
+
+#Step time and peak memory of direct_dif='analytic' against the double backward 'autograd' path.
+#Every configuration runs in a fresh process so the peak RSS on CPU is not polluted by earlier runs.
+
+def job_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--datasets', type=str, nargs='+', default=['support','metabric','kkbox'], help='datasets to run')
+    parser.add_argument('--objective', type=str, nargs='?', default='S_mean', help='S_mean or hazard_mean')
+    parser.add_argument('--bs', type=int, nargs='?', default=1000, help='batch size')
+    parser.add_argument('--steps', type=int, nargs='?', default=200, help='training steps to time')
+    parser.add_argument('--device', type=str, nargs='?', default='cpu', help='cpu or cuda:0')
+    return parser
+
+def run_config(dataset,direct_dif,objective,bs,steps,device):
+    torch.manual_seed(0)
+    dataloader = get_dataloader(dataset,bs,1337,0,sumo_net=True)
+    net_init_params = {
+        'd_in_x': dataloader.dataset.X.shape[1],
+        'cat_size_list': dataloader.dataset.unique_cat_cols,
+        'd_in_y': 1,
+        'd_out': 1,
+        'bounding_op': torch.relu,
+        'transformation': torch.tanh,
+        'layers_x': [32,32],
+        'layers_t': [1],
+        'layers': [32,32],
+        'direct_dif': direct_dif,
+        'objective': objective,
+        'dropout': 0.1,
+        'eps': 1e-3
+    }
+    model = survival_net_basic(**net_init_params).to(device)
+    optimizer = torch.optim.Adam(model.parameters(), lr=1e-2)
+    train_objective = get_objective(objective)
+
+    X, x_cat, y, delta = next(iter(dataloader))
+    X,y = X.to(device),y.to(device)
+    x_cat = x_cat.to(device) if not isinstance(x_cat,list) else x_cat
+    model.eval()
+    f_ref = model(X,y,x_cat)
+    model.direct = 'autograd'
+    f_autograd = model(X,y,x_cat)
+    model.direct = direct_dif
+    max_diff = (f_ref-f_autograd).abs().max().item()
+    model.train()
+
+    cuda = str(device).startswith('cuda')
+    if cuda:
+        torch.cuda.reset_peak_memory_stats(device)
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    timings = []
+    while len(timings)<steps:
+        for X, x_cat, y, delta in dataloader:
+            X,y,delta = X.to(device),y.to(device),delta.to(device)
+            if not isinstance(x_cat,list):
+                x_cat = x_cat.to(device)
+            mask = delta == 1
+            start = time.perf_counter()
+            S,f = model.forward_train(X,y,mask,x_cat)
+            loss = train_objective(S,f)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            if cuda:
+                torch.cuda.synchronize(device)
+            timings.append(time.perf_counter()-start)
+            if len(timings)>=steps:
+                break
+    if cuda:
+        peak_mb = torch.cuda.max_memory_allocated(device)/2**20
+    else:
+        peak_mb = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss-base_rss)/2**10
+    return sum(timings)/len(timings),peak_mb,max_diff
+
+if __name__ == '__main__':
+    args = vars(job_parser().parse_args())
+    ctx = multiprocessing.get_context('spawn')
+    results = []
+    for dataset in args['datasets']:
+        for direct_dif in ['autograd','analytic']:
+            with ctx.Pool(1) as pool:
+                step_time,peak_mb,max_diff = pool.apply(run_config,(dataset,direct_dif,args['objective'],args['bs'],args['steps'],args['device']))
+            results.append([dataset,direct_dif,step_time*1e3,peak_mb,max_diff])
+            print(results[-1])
+    df = pd.DataFrame(results,columns=['dataset','direct_dif','ms_per_step','peak_mb','max_abs_diff_log_f'])
+    print(df)
+    df.to_csv('benchmark_analytic_derivative.csv')
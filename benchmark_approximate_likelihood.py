@@ -0,0 +1,72 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from utils.dataloaders import get_dataloader
+from utils.hazard_model_likelihood import ApproximateLikelihood
+from pycox_local.pycox.evaluation import EvalSurv
+
+#Wall time of ApproximateLikelihood on a full test split against the previous per-individual pandas extraction
+#(LegacyApproximateLikelihood), using the surv_df_raw path of post_processing_likelihood_select_average.py.
+#The survival frame is simulated (Weibull curves on the grid of a sumo_loop) so no trained model is needed.
+
+class LegacyApproximateLikelihood(ApproximateLikelihood):
+    def get_densities(self,surv_df_raw=None):
+        survival_df_observed = surv_df_raw[self.mask_observed].transpose().drop_duplicates(keep='first')
+        min_index, max_index = 0, len(survival_df_observed.index.values) - 1
+        eval_observed = EvalSurv(survival_df_observed, self.t[self.mask_observed], self.d[self.mask_observed])
+        indices = eval_observed.idx_at_times(self.t[self.mask_observed])
+        left_index = np.minimum(np.maximum(indices - self.half_width + 1, min_index), max_index - 1).squeeze()
+        right_index = np.minimum(indices + self.half_width, max_index).squeeze()
+        left_survival = np.array([survival_df_observed.iloc[left_index[i], i] for i in range(len(left_index))])
+        right_survival = np.array([survival_df_observed.iloc[right_index[i], i] for i in range(len(right_index))])
+        old_time_scale = np.array(survival_df_observed.index)
+        original_scale = self.ds.duration_mapper.inverse_transform(old_time_scale.reshape(-1, 1))
+        zero_one_scale = self.ds.duration_mapper_2.transform(original_scale.reshape(-1, 1))
+        survival_df_observed.index = zero_one_scale.squeeze()
+        left_time = np.array(survival_df_observed.index[left_index])
+        right_time = np.array(survival_df_observed.index[right_index])
+        self.densities = (left_survival - right_survival) / (right_time - left_time)
+        return self.densities
+
+    def get_survival(self,surv_df_raw=None):
+        survival_df_censored = surv_df_raw[~self.mask_observed].transpose().drop_duplicates(keep='first')
+        eval_censored = EvalSurv(survival_df_censored, self.t[~self.mask_observed], self.d[~self.mask_observed])
+        indices = eval_censored.idx_at_times(self.t[~self.mask_observed]).squeeze()
+        self.survival = np.array([survival_df_censored.iloc[indices[i], i] for i in range(len(indices))])
+        return self.survival
+
+def job_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dataset', type=str, nargs='?', default='kkbox', help='which dataset to run')
+    parser.add_argument('--grid_size', type=int, nargs='?', default=100, help='number of time points')
+    parser.add_argument('--half_width', type=int, nargs='?', default=1, help='half width of the density estimate')
+    parser.add_argument('--skip_legacy', action='store_true', help='only time the array implementation')
+    return parser
+
+def simulate_surv_df(y,grid_size,seed=0):
+    rng = np.random.RandomState(seed)
+    n = len(y)
+    shape = rng.uniform(0.5, 3., n)
+    scale = rng.uniform(0.5, 2., n) * np.abs(y).mean()
+    grid = np.linspace(y.min(), y.max(), grid_size)
+    surv = np.exp(-(np.abs(grid[None,:])/scale[:,None])**shape[:,None]).astype('float32')
+    return pd.DataFrame(surv, columns=grid)
+
+def timed(cls,args,dataset,y,delta,surv_df):
+    l_obj = cls(None, None, y, delta, 1000, half_width=args['half_width'], dataset=dataset)
+    start = time.perf_counter()
+    ll = l_obj.get_approximated_likelihood(input_dat=None, target_dat=None, surv_df_raw=surv_df)
+    return time.perf_counter()-start,ll
+
+if __name__ == '__main__':
+    args = vars(job_parser().parse_args())
+    dataloader = get_dataloader(args['dataset'],1000,1337,0,sumo_net=True)
+    y = dataloader.dataset.test_y.squeeze().numpy()
+    delta = dataloader.dataset.test_delta.squeeze().numpy()
+    surv_df = simulate_surv_df(y,args['grid_size'])
+    t_new,ll_new = timed(ApproximateLikelihood,args,dataloader.dataset,y,delta,surv_df)
+    print('array implementation:', t_new, 's, log-likelihood', ll_new)
+    if not args['skip_legacy']:
+        t_old,ll_old = timed(LegacyApproximateLikelihood,args,dataloader.dataset,y,delta,surv_df)
+        print('legacy implementation:', t_old, 's, log-likelihood', ll_old)
@@ -0,0 +1,62 @@
+import argparse
+import time
+import pandas as pd
+import torch
+import gpytorch
+from nets.GWI import *
+
+#Time and accuracy of the GWI A_PQ trace term: exact 'eig' on rk_hat, exact eigvalsh on the symmetrised rk_hat
+#(the target of slq) and the stochastic Lanczos 'slq' estimate, forward and backward, for growing x_s.
+
+def job_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--x_s', type=int, nargs='+', default=[250,500,1000,2000,4000], help='size of Z_prime')
+    parser.add_argument('--n', type=int, nargs='?', default=5000, help='batch size')
+    parser.add_argument('--d', type=int, nargs='?', default=10, help='covariate dimension')
+    parser.add_argument('--m', type=int, nargs='?', default=200, help='inducing points')
+    parser.add_argument('--probes', type=int, nargs='?', default=10, help='slq probe vectors')
+    parser.add_argument('--steps', type=int, nargs='?', default=30, help='slq lanczos steps')
+    parser.add_argument('--device', type=str, nargs='?', default='cpu', help='cpu or cuda:0')
+    return parser
+
+def build(args):
+    torch.manual_seed(0)
+    X = torch.randn(args['n'],args['d'],device=args['device'])
+    k = gpytorch.kernels.RBFKernel().to(args['device'])
+    k._set_lengthscale(Kernel().get_median_ls(X,X))
+    r = r_param_cholesky_scaling(k=k, Z=X[:args['m']], X=X[-args['m']:], sigma=1.0)
+    r.init_L()
+    return X,r.to(args['device'])
+
+def timed(model,X,Z_prime):
+    model.zero_grad()
+    start = time.perf_counter()
+    res = model.get_APQ(X,Z_prime)
+    res.backward()
+    if X.is_cuda:
+        torch.cuda.synchronize()
+    return time.perf_counter()-start,res.item()
+
+def symmetrised_exact(model,X,Z_prime):
+    with torch.no_grad():
+        rk_hat = 1 / X.shape[0] * model.r(Z_prime, X) @ model.k(X, Z_prime).evaluate()
+        eigs = torch.linalg.eigvalsh(0.5*(rk_hat+rk_hat.t()))
+        return (eigs.clamp_min(0)**0.5).sum().item() / model.x_s ** 0.5
+
+if __name__ == '__main__':
+    args = vars(job_parser().parse_args())
+    X,r = build(args)
+    results = []
+    for x_s in args['x_s']:
+        Z_prime = torch.randn(x_s,args['d'],device=args['device'])
+        eig = GWI(N=X.shape[0],m_q=None,m_p=0.,r=r,x_s=x_s).to(args['device'])
+        slq = GWI(N=X.shape[0],m_q=None,m_p=0.,r=r,x_s=x_s,apq_estimator='slq',
+                  slq_probes=args['probes'],slq_steps=args['steps']).to(args['device'])
+        t_eig,v_eig = timed(eig,X,Z_prime)
+        t_slq,v_slq = timed(slq,X,Z_prime)
+        v_sym = symmetrised_exact(eig,X,Z_prime)
+        results.append([x_s,t_eig,t_slq,v_eig,v_sym,v_slq])
+        print(results[-1])
+    df = pd.DataFrame(results,columns=['x_s','eig_s','slq_s','apq_eig','apq_sym_exact','apq_slq'])
+    print(df)
+    df.to_csv('benchmark_apq.csv')
@@ -0,0 +1,58 @@
+import argparse
+import subprocess
+import sys
+import time
+import numpy as np
+
+#Cold start of a cluster job: wall time of `python serious_run.py --help` in fresh interpreters against a budget,
+#the slowest imports from -X importtime, and the first evaluation call in a fresh process, where numba either
+#compiles the concordance and IPCW kernels or loads them from its on-disk cache.
+
+FIRST_EVAL = '''
+import time
+import numpy as np
+import pandas as pd
+start = time.perf_counter()
+from pycox_local.pycox.evaluation import EvalSurv
+rng = np.random.RandomState(0)
+surv = pd.DataFrame(np.sort(rng.uniform(size=(50, 1000)), axis=0)[::-1], np.linspace(0, 1, 50))
+ev = EvalSurv(surv, rng.uniform(size=1000), rng.binomial(1, 0.5, 1000).astype('float'), censor_surv='km')
+ev.concordance_td(engine='sorted')
+ev.integrated_brier_score(np.linspace(0, 1, 50))
+print(time.perf_counter() - start)
+'''
+
+def job_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, nargs='?', default=5, help='fresh interpreters to time')
+    parser.add_argument('--budget', type=float, nargs='?', default=3.0, help='seconds allowed for serious_run.py --help')
+    parser.add_argument('--top', type=int, nargs='?', default=15, help='slowest imports to list')
+    return parser
+
+def wall_time(cmd):
+    start = time.perf_counter()
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter()-start
+
+def slowest_imports(top):
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import serious_run'],
+                         stderr=subprocess.PIPE, stdout=subprocess.DEVNULL, text=True).stderr
+    rows = []
+    for line in out.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = [el.strip() for el in line[len('import time:'):].split('|')]
+        rows.append((int(cumulative), name))
+    return sorted(rows, reverse=True)[:top]
+
+if __name__ == '__main__':
+    args = vars(job_parser().parse_args())
+    times = [wall_time([sys.executable, 'serious_run.py', '--help']) for _ in range(args['runs'])]
+    median = float(np.median(times))
+    print(f"serious_run.py --help: median {median:.2f}s, min {min(times):.2f}s, budget {args['budget']:.2f}s")
+    for cumulative, name in slowest_imports(args['top']):
+        print(f"{cumulative/1e6:8.3f}s  {name}")
+    for label in ['first eval, empty or stale numba cache', 'first eval, numba cache warm']:
+        out = subprocess.run([sys.executable, '-c', FIRST_EVAL], check=True, stdout=subprocess.PIPE, text=True).stdout
+        print(f"{label}: {float(out.split()[-1]):.2f}s")
+    sys.exit(0 if median <= args['budget'] else 1)
@@ -0,0 +1,47 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from pycox_local.pycox.evaluation import EvalSurv
+
+#Scaling of the time dependent concordance for the O(n^2) 'pairwise' and the sort based 'sorted' engine.
+#Survival curves are Weibull with individual shape and scale, so the curves cross and the ranking changes over time.
+
+def job_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000,10000,100000,1000000], help='number of individuals')
+    parser.add_argument('--grid_size', type=int, nargs='?', default=100, help='number of rows in the survival matrix')
+    parser.add_argument('--max_pairwise', type=int, nargs='?', default=30000, help='largest n to run the pairwise engine on')
+    return parser
+
+def simulate(n,grid_size,seed=0):
+    rng = np.random.RandomState(seed)
+    shape = rng.uniform(0.5, 3., n)
+    scale = rng.uniform(1., 10., n)
+    durations = (scale*rng.weibull(shape)).round(2)
+    events = rng.binomial(1, 0.7, n).astype('float')
+    time_grid = np.linspace(0, np.quantile(durations, 0.99), grid_size)
+    surv = np.exp(-(time_grid[:,None]/scale[None,:])**shape[None,:]).astype('float32')
+    return pd.DataFrame(surv, time_grid), durations, events
+
+def time_engine(ev,engine):
+    ev.concordance_td(engine=engine) #numba compilation
+    start = time.perf_counter()
+    conc = ev.concordance_td(engine=engine)
+    return time.perf_counter()-start,conc
+
+if __name__ == '__main__':
+    args = vars(job_parser().parse_args())
+    results = []
+    for n in args['sizes']:
+        ev = EvalSurv(*simulate(n,args['grid_size']))
+        t_sorted,c_sorted = time_engine(ev,'sorted')
+        if n<=args['max_pairwise']:
+            t_pairwise,c_pairwise = time_engine(ev,'pairwise')
+        else:
+            t_pairwise,c_pairwise = np.nan,np.nan
+        results.append([n,t_pairwise,t_sorted,c_pairwise,c_sorted])
+        print(results[-1])
+    df = pd.DataFrame(results,columns=['n','pairwise_s','sorted_s','conc_pairwise','conc_sorted'])
+    print(df)
+    df.to_csv('benchmark_concordance.csv')
@@ -0,0 +1,67 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+import torchtuples as tt
+from pycox_local.pycox.models.data import CoxCCDataset, CoxTimeDataset, make_at_risk_dict, sample_alive_from_dates
+
+#Batches per second of the Cox-CC/Cox-Time case-control datasets: the searchsorted sampler against the
+#previous dict of at-risk slices with a per-case python loop (LegacyCoxCCDataset). Data is simulated at kkbox scale.
+
+class LegacyCoxCCDataset(CoxCCDataset):
+    def __init__(self, input, durations, events, n_control=1):
+        df_train_target = pd.DataFrame(dict(duration=durations, event=events))
+        self.durations = df_train_target.loc[lambda x: x['event'] == 1]['duration']
+        self.at_risk_dict = make_at_risk_dict(durations)
+        self.input = tt.tuplefy(input)
+        self.n_control = n_control
+
+    def __getitem__(self, index):
+        fails = self.durations.iloc[index]
+        x_case = self.input.iloc[fails.index]
+        control_idx = sample_alive_from_dates(fails.values, self.at_risk_dict, self.n_control)
+        x_control = tt.TupleTree(self.input.iloc[idx] for idx in control_idx.transpose())
+        return tt.tuplefy(x_case, x_control).to_tensor()
+
+def job_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n', type=int, nargs='?', default=2000000, help='number of individuals')
+    parser.add_argument('--d', type=int, nargs='?', default=50, help='number of covariates')
+    parser.add_argument('--bs', type=int, nargs='+', default=[256,1024,8192], help='batch sizes')
+    parser.add_argument('--n_control', type=int, nargs='?', default=1, help='controls per case')
+    parser.add_argument('--batches', type=int, nargs='?', default=200, help='batches to time')
+    return parser
+
+def simulate(n,d,seed=0):
+    rng = np.random.RandomState(seed)
+    durations = np.sort(rng.randint(0, 800, n)).astype('float32')
+    events = rng.binomial(1, 0.3, n).astype('float32')
+    input = rng.randn(n, d).astype('float32')
+    return input, durations, events
+
+def batches_per_sec(dataset,bs,batches):
+    idx = np.random.randint(0, len(dataset), (batches, bs))
+    start = time.perf_counter()
+    for index in idx:
+        dataset[index]
+    return batches/(time.perf_counter()-start)
+
+if __name__ == '__main__':
+    args = vars(job_parser().parse_args())
+    input, durations, events = simulate(args['n'],args['d'])
+    start = time.perf_counter()
+    legacy = LegacyCoxCCDataset(input, durations, events, args['n_control'])
+    init_legacy = time.perf_counter()-start
+    start = time.perf_counter()
+    dataset = CoxCCDataset(input, durations, events, args['n_control'])
+    init_new = time.perf_counter()-start
+    cox_time = CoxTimeDataset(input, durations, events, args['n_control'])
+    print('init seconds, legacy:', init_legacy, 'searchsorted:', init_new)
+    results = []
+    for bs in args['bs']:
+        results.append([bs,batches_per_sec(legacy,bs,args['batches']),batches_per_sec(dataset,bs,args['batches']),
+                        batches_per_sec(cox_time,bs,args['batches'])])
+        print(results[-1])
+    df = pd.DataFrame(results,columns=['bs','legacy_batches_s','coxcc_batches_s','coxtime_batches_s'])
+    print(df)
+    df.to_csv('benchmark_coxcc_sampler.csv')
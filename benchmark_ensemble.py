@@ -0,0 +1,84 @@
+import argparse
+import time
+import torch
+from nets.nets import *
+from sumo_net.ensemble_training import ensemble_training
+from utils.dataloaders import get_dataloader
+
+#Compares K survival_net_basic models trained one after the other against one vmapped survival_net_ensemble of K members.
+
+def job_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dataset', type=str, nargs='?', default='metabric', help='which dataset to run')
+    parser.add_argument('--objective', type=str, nargs='?', default='S_mean', help='S_mean or hazard_mean')
+    parser.add_argument('--direct_dif', type=str, nargs='?', default='analytic', help='analytic or autograd')
+    parser.add_argument('--members', type=int, nargs='?', default=8, help='ensemble size K')
+    parser.add_argument('--bs', type=int, nargs='?', default=100, help='batch size')
+    parser.add_argument('--width', type=int, nargs='?', default=32, help='width of every layer')
+    parser.add_argument('--depth', type=int, nargs='?', default=2, help='depth of covariate and middle net')
+    parser.add_argument('--epochs', type=int, nargs='?', default=3, help='epochs to time per method')
+    return parser
+
+def train_single(net_init_params,seed,dataloader,objective,epochs):
+    torch.manual_seed(seed)
+    model = survival_net_basic(**net_init_params)
+    optimizer = torch.optim.Adam(model.parameters(), lr=1e-2)
+    model.train()
+    for e in range(epochs):
+        for X, x_cat, y, delta in dataloader:
+            mask = delta == 1
+            loss = objective(*model.forward_train(X, y, mask, x_cat))
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+    return model
+
+if __name__ == '__main__':
+    args = vars(job_parser().parse_args())
+    dataloader = get_dataloader(args['dataset'],args['bs'],1337,0,sumo_net=True)
+    dataset = dataloader.dataset
+    net_init_params = {
+        'd_in_x': dataset.X.shape[1],
+        'cat_size_list': dataset.unique_cat_cols,
+        'd_in_y': 1,
+        'd_out': 1,
+        'bounding_op': torch.relu,
+        'transformation': torch.tanh,
+        'layers_x': [args['width']]*args['depth'],
+        'layers_t': [1],
+        'layers': [args['width']]*args['depth'],
+        'direct_dif': args['direct_dif'],
+        'objective': args['objective'],
+        'dropout': 0.0,
+        'eps': 1e-3
+    }
+    seeds = list(range(args['members']))
+    objective = get_objective(args['objective'])
+
+    trainer = ensemble_training(dataset,net_init_params,seeds,args['bs'])
+    trainer.model.eval()
+    dataset.set(mode='train')
+    X,y,delta = dataset.X[:args['bs']],dataset.y[:args['bs']],dataset.delta[:args['bs']]
+    x_cat = dataset.cat_X[:args['bs']] if not isinstance(dataset.cat_X,list) else []
+    K = len(seeds)
+    expand = lambda t: t.unsqueeze(0).expand(K,*t.shape)
+    ensemble_losses = trainer.model.loss(expand(X),expand(y),expand(delta),expand(x_cat) if not isinstance(x_cat,list) else [])
+    max_diff = 0.
+    for k in range(K):
+        member = trainer.model.member(k).eval()
+        single_loss = objective(*member.forward_train(X, y, delta == 1, x_cat)).item()
+        max_diff = max(max_diff,abs(single_loss-ensemble_losses[k].item()))
+    print(f'max abs member loss difference (eval mode): {max_diff}')
+
+    start = time.perf_counter()
+    for seed in seeds:
+        train_single(net_init_params,seed,dataloader,objective,args['epochs'])
+    t_single = time.perf_counter()-start
+
+    start = time.perf_counter()
+    for e in range(args['epochs']):
+        trainer.train_epoch()
+    t_ensemble = time.perf_counter()-start
+    print(f'{K} single models: {t_single:.3f} s')
+    print(f'ensemble of {K}: {t_ensemble:.3f} s')
+    print(f'speedup: {t_single/t_ensemble:.2f}x')
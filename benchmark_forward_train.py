@@ -0,0 +1,86 @@
+import argparse
+import copy
+import time
+import torch
+from nets.nets import *
+from utils.dataloaders import get_dataloader
+
+#Compares the fused forward_train against the two pass forward_cum + forward used before in training_loop.
+
+def job_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dataset', type=str, nargs='?', default='metabric', help='which dataset to run')
+    parser.add_argument('--net_type', type=str, nargs='?', default='survival_net_basic', help='survival_net_basic, weibull_net or lognormal_net')
+    parser.add_argument('--objective', type=str, nargs='?', default='S_mean', help='S_mean or hazard_mean')
+    parser.add_argument('--direct_dif', type=str, nargs='?', default='autograd', help='autograd, full or semi')
+    parser.add_argument('--bs', type=int, nargs='?', default=100, help='batch size')
+    parser.add_argument('--epochs', type=int, nargs='?', default=3, help='epochs to time per method')
+    return parser
+
+def two_pass(model,X,x_cat,y,mask):
+    X_f = X[mask, :]
+    y_f = y[mask, :]
+    x_cat_f = x_cat[mask, :] if not isinstance(x_cat, list) else []
+    S = model.forward_cum(X, y, mask, x_cat)
+    f = model(X_f, y_f, x_cat_f)
+    return S,f
+
+def fused(model,X,x_cat,y,mask):
+    return model.forward_train(X, y, mask, x_cat)
+
+def time_method(method,model,dataloader,objective,epochs):
+    optimizer = torch.optim.Adam(model.parameters(), lr=1e-2)
+    model.train()
+    timings = []
+    for e in range(epochs):
+        for X, x_cat, y, delta in dataloader:
+            mask = delta == 1
+            start = time.perf_counter()
+            S,f = method(model,X,x_cat,y,mask)
+            loss = objective(S,f)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            timings.append(time.perf_counter()-start)
+    return sum(timings)/len(timings)
+
+if __name__ == '__main__':
+    args = vars(job_parser().parse_args())
+    dataloader = get_dataloader(args['dataset'],args['bs'],1337,0,sumo_net=True)
+    net_init_params = {
+        'd_in_x': dataloader.dataset.X.shape[1],
+        'cat_size_list': dataloader.dataset.unique_cat_cols,
+        'd_in_y': 1,
+        'd_out': 1,
+        'bounding_op': torch.relu,
+        'transformation': torch.tanh,
+        'layers_x': [32,32],
+        'layers_t': [1],
+        'layers': [32,32],
+        'direct_dif': args['direct_dif'],
+        'objective': args['objective'],
+        'dropout': 0.1,
+        'eps': 1e-3
+    }
+    if args['net_type']=='weibull_net':
+        model = weibull_net(**net_init_params)
+    elif args['net_type']=='lognormal_net':
+        model = lognormal_net(**net_init_params)
+    else:
+        model = survival_net_basic(**net_init_params)
+    objective = get_objective(args['objective'])
+
+    model.eval()
+    max_diff = 0.
+    for X, x_cat, y, delta in dataloader:
+        mask = delta == 1
+        loss_two_pass = objective(*two_pass(model,X,x_cat,y,mask)).item()
+        loss_fused = objective(*fused(model,X,x_cat,y,mask)).item()
+        max_diff = max(max_diff,abs(loss_two_pass-loss_fused))
+    print(f'max abs loss difference (eval mode): {max_diff}')
+
+    t_two_pass = time_method(two_pass,copy.deepcopy(model),dataloader,objective,args['epochs'])
+    t_fused = time_method(fused,copy.deepcopy(model),dataloader,objective,args['epochs'])
+    print(f'two pass: {t_two_pass*1e3:.3f} ms/batch')
+    print(f'fused: {t_fused*1e3:.3f} ms/batch')
+    print(f'speedup: {t_two_pass/t_fused:.2f}x')
@@ -0,0 +1,68 @@
+import argparse
+import time
+import pandas as pd
+import torch
+from nets.nets import *
+from utils.dataloaders import get_dataloader,prefetch_dataloader
+
+#Training throughput (samples/sec) of the serial custom_dataloader against prefetch_dataloader with 1, 2 and 4 workers.
+
+def job_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dataset', type=str, nargs='?', default='kkbox', help='which dataset to run')
+    parser.add_argument('--workers', type=int, nargs='+', default=[0,1,2,4], help='prefetch workers, 0 is serial')
+    parser.add_argument('--bs', type=int, nargs='?', default=1028, help='batch size')
+    parser.add_argument('--steps', type=int, nargs='?', default=500, help='training steps to time')
+    parser.add_argument('--device', type=str, nargs='?', default='cpu', help='cpu or cuda:0')
+    return parser
+
+def throughput(dataloader,workers,steps,device):
+    torch.manual_seed(0)
+    net_init_params = {
+        'd_in_x': dataloader.dataset.X.shape[1],
+        'cat_size_list': dataloader.dataset.unique_cat_cols,
+        'd_in_y': 1,
+        'd_out': 1,
+        'bounding_op': torch.relu,
+        'transformation': torch.tanh,
+        'layers_x': [128,128],
+        'layers_t': [1],
+        'layers': [128,128],
+        'direct_dif': 'autograd',
+        'objective': 'S_mean',
+        'dropout': 0.1,
+        'eps': 1e-3
+    }
+    model = survival_net_basic(**net_init_params).to(device)
+    optimizer = torch.optim.Adam(model.parameters(), lr=1e-2)
+    objective = get_objective('S_mean')
+    loader = prefetch_dataloader(dataloader,device,workers=workers) if workers>0 else dataloader
+    samples = 0
+    start = time.perf_counter()
+    while True:
+        batches = iter(loader)
+        for X, x_cat, y, delta in batches:
+            X,y,delta = X.to(device),y.to(device),delta.to(device)
+            if not isinstance(x_cat,list):
+                x_cat = x_cat.to(device)
+            S,f = model.forward_train(X,y,delta==1,x_cat)
+            loss = objective(S,f)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            samples += X.shape[0]
+            steps -= 1
+            if steps==0:
+                batches.close()
+                return samples/(time.perf_counter()-start)
+
+if __name__ == '__main__':
+    args = vars(job_parser().parse_args())
+    dataloader = get_dataloader(args['dataset'],args['bs'],1337,0,sumo_net=True)
+    results = []
+    for workers in args['workers']:
+        results.append([workers,throughput(dataloader,workers,args['steps'],args['device'])])
+        print(results[-1])
+    df = pd.DataFrame(results,columns=['workers','samples_per_sec'])
+    print(df)
+    df.to_csv(f'benchmark_prefetch_{args["dataset"]}.csv')
@@ -3,6 +3,10 @@ import torch
 from serious_run import *
 from astropy.table import Table
 from utils.hazard_model_likelihood import *
+import torchtuples as tt
+from pycox_local.pycox.models import CoxPH,CoxCC,CoxTime,DeepHitSingle
+from pycox_local.pycox.models.cox_time import MLPVanillaCoxTime,MixedInputMLPCoxTime
+from utils.deephit_transformation_fix import LabTransDiscreteTime
 DURS = [50, 100, 200, 400]
 
 def calculate_t_p(model,X,x_cat,y,p):
@@ -36,11 +40,14 @@ def loop_over_p(model,dataloader,p_list, device='cuda:0'):
             x_cat_in = x_cat[~mask, :].to(device)
         else:
             x_cat_in = x_cat
-        tmp_T_p_list = []
-        for p in p_list:
-            F = calculate_t_p(model,X_in,x_cat_in,y_in,p)
-            tmp_T_p_list.append(F)
-        T_p_list.append(torch.cat(tmp_T_p_list,dim=1))
+        if hasattr(model,'predict_quantile'):
+            T_p_list.append(model.predict_quantile(X_in,x_cat_in,p_list).cpu())
+        else:
+            tmp_T_p_list = []
+            for p in p_list:
+                F = calculate_t_p(model,X_in,x_cat_in,y_in,p)
+                tmp_T_p_list.append(F)
+            T_p_list.append(torch.cat(tmp_T_p_list,dim=1))
         T_list.append(y_in.cpu())
     T_p = torch.cat(T_p_list,dim=0)
     T=torch.cat(T_list,dim=0)
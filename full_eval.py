@@ -9,7 +9,7 @@ def calc_eval_objective( S, f, S_extended, durations, events, time_grid,train_ob
     val_likelihood = train_objective(S, f)
     eval_obj = EvalSurv(surv=S_extended, durations=durations, events=events,
                         censor_surv='km')  # Add index and pass as DF
-    conc = eval_obj.concordance_td()
+    conc = eval_obj.concordance_td(engine='sorted')
     ibs = eval_obj.integrated_brier_score(time_grid)
     inll = eval_obj.integrated_nbll(time_grid)
     return val_likelihood, conc, ibs, inll
@@ -28,6 +28,7 @@ def eval_loop(grid_size,model,dataloader,train_objective,device):
         t_grid_np = np.linspace(dataloader.dataset.min_duration, dataloader.dataset.max_duration,
                                 grid_size)
         time_grid = torch.from_numpy(t_grid_np).float().unsqueeze(-1)
+        input_time = time_grid.to(device)
         for i, (X, x_cat, y, delta) in enumerate(dataloader):
             X = X.to(device)
             y = y.to(device)
@@ -42,20 +43,11 @@ def eval_loop(grid_size,model,dataloader,train_objective,device):
                 x_cat_f = []
             S = model.forward_cum(X, y, mask, x_cat)
             f = model(X_f, y_f, x_cat_f)
-            if not isinstance(x_cat, list):
-                for chk, chk_cat in zip(torch.chunk(X, chunks), torch.chunk(x_cat, chunks)):
-                    input_time = time_grid.repeat((chk.shape[0], 1)).to(device)
-                    X_repeat = chk.repeat_interleave(grid_size, 0)
-                    x_cat_repeat = chk_cat.repeat_interleave(grid_size, 0)
-                    S_serie = model.forward_S_eval(X_repeat, input_time, x_cat_repeat)  # Fix
-                    S_series_container.append(S_serie.view(-1, grid_size).t().cpu())
-            else:
-                x_cat_repeat = []
-                for chk in torch.chunk(X, chunks):
-                    input_time = time_grid.repeat((chk.shape[0], 1)).to(device)
-                    X_repeat = chk.repeat_interleave(grid_size, 0)
-                    S_serie = model.forward_S_eval(X_repeat, input_time, x_cat_repeat)  # Fix
-                    S_series_container.append(S_serie.view(-1, grid_size).t().cpu())
+            x_chunks = torch.chunk(X, chunks)
+            cat_chunks = torch.chunk(x_cat, chunks) if not isinstance(x_cat, list) else [[]]*len(x_chunks)
+            for chk, chk_cat in zip(x_chunks, cat_chunks):
+                S_serie = model.forward_S_eval_grid(chk, input_time, chk_cat)
+                S_series_container.append(S_serie.cpu())
             S_log.append(S)
             f_log.append(f)
             durations.append(y.cpu().numpy())
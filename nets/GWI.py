@@ -65,6 +65,72 @@ def ensure_pos_diag_svgp(K, cap=1e-1):
     return K
 
 
+def lanczos(matvec, v, steps, tol=1e-6):
+    # Lanczos on each column of v with full reorthogonalisation. Stops early once one of the Krylov spaces is
+    # exhausted (beta ~ 0), the returned tridiagonal T is then smaller than steps x steps.
+    q = v / v.norm(dim=0, keepdim=True)
+    Q = [q]
+    alphas, betas = [], []
+    scale = 0.
+    for j in range(steps):
+        w = matvec(q)
+        alpha = (q * w).sum(0)
+        alphas.append(alpha)
+        basis = torch.stack(Q, 0)
+        for _ in range(2):
+            w = w - torch.einsum('jdp,jp->dp', basis, torch.einsum('jdp,dp->jp', basis, w))
+        beta = w.norm(dim=0)
+        scale = max(scale, alpha.detach().abs().max().item())
+        if j == steps - 1 or beta.detach().min().item() <= tol * scale:
+            break
+        betas.append(beta)
+        q = w / beta
+        Q.append(q)
+    T = torch.diag_embed(torch.stack(alphas, -1))
+    if betas:
+        beta = torch.stack(betas, -1)
+        T = T + torch.diag_embed(beta, offset=1) + torch.diag_embed(beta, offset=-1)
+    return T
+
+
+class _SqrtQuadrature(torch.autograd.Function):
+    # e_1^T T^1/2 e_1 for a batch of symmetric T, negative Ritz values are cut at 0. The backward uses the divided
+    # differences of the square root, 1/(sqrt(l_i)+sqrt(l_j)) for positive pairs, so it stays finite for clustered
+    # Ritz values where the eigenvector gradient of eigh blows up.
+    @staticmethod
+    def forward(ctx, T):
+        lam, U = torch.linalg.eigh(T)
+        s = lam.clamp_min(0).sqrt()
+        u = U[..., 0, :]
+        ctx.save_for_backward(lam, s, U, u)
+        return (u ** 2 * s).sum(-1)
+
+    @staticmethod
+    def backward(ctx, grad):
+        lam, s, U, u = ctx.saved_tensors
+        eps = torch.finfo(lam.dtype).eps
+        pos = lam > 0
+        both = pos.unsqueeze(-1) & pos.unsqueeze(-2)
+        diff = lam.unsqueeze(-1) - lam.unsqueeze(-2)
+        s_sum = (s.unsqueeze(-1) + s.unsqueeze(-2)).clamp_min(eps)
+        s_diff = s.unsqueeze(-1) - s.unsqueeze(-2)
+        gamma = torch.where(both, 1. / s_sum,
+                            torch.where(diff.abs() > eps, s_diff / torch.where(diff.abs() > eps, diff, torch.ones_like(diff)),
+                                        torch.zeros_like(diff)))
+        inner = gamma * u.unsqueeze(-1) * u.unsqueeze(-2)
+        return grad.view(-1, 1, 1) * (U @ inner @ U.transpose(-1, -2))
+
+
+def slq_trace_sqrt(matvec, dim, probes=10, steps=30, device=None, dtype=torch.float32):
+    """Stochastic Lanczos quadrature estimate of tr(A^1/2) for a symmetric dim x dim matrix A that is only
+    available through matvec(V) = A @ V, V of shape [dim, probes]. Negative eigenvalues count as 0.
+    Cost is O(steps) matvecs plus O(dim * steps^2 * probes) for the reorthogonalisation, against O(dim^3) for an
+    eigendecomposition. Differentiable through matvec."""
+    v = torch.randint(0, 2, (dim, probes), device=device).to(dtype) * 2. - 1.
+    T = lanczos(matvec, v, steps)
+    return dim * _SqrtQuadrature.apply(T).mean()
+
+
 class r_param_cholesky_scaling(torch.nn.Module):
     def __init__(self, k, Z, X, sigma, scale_init=1.0, parametrize_Z=False):
         super(r_param_cholesky_scaling, self).__init__()
@@ -151,6 +217,17 @@ class r_param_cholesky_scaling(torch.nn.Module):
             out = self.k(x1, x2).evaluate() - kzx_1.t() @ sol + T_mat  # /self.sigma
             return out
 
+    def sample(self, x):
+        # Draw from N(0, r(x)) without forming the b x b covariance. The k(x,Z)LL^Tk(Z,x) part is sampled
+        # exactly through the m inducing points, the residual k(x,x)-k(x,Z)K_ZZ^-1k(Z,x) through its diagonal.
+        # O(b m^2) instead of the O(b^3) Cholesky of r(x).
+        L = torch.tril(self.L) + self.eye * self.reg
+        L = ensure_pos_diag(L)
+        kzx = self.k(self.Z, x).evaluate()
+        low_rank = kzx.t() @ (L @ torch.randn(L.shape[1], 1, device=x.device, dtype=x.dtype))
+        residual = self.k(x.unsqueeze(1)).evaluate().view(-1) - (kzx * (self.inv_Z @ kzx)).sum(0)
+        return low_rank + residual.clamp_min(0).sqrt().unsqueeze(-1) * torch.randn_like(low_rank)
+
     def get_sigma_debug(self):
         with torch.no_grad():
             L = torch.tril(self.L) + self.eye * self.reg
@@ -159,9 +236,14 @@ class r_param_cholesky_scaling(torch.nn.Module):
 
 
 class GWI(torch.nn.Module):
-    def __init__(self, N, m_q, m_p, r, reg=1e-1, sigma=1.0, x_s=250):
+    def __init__(self, N, m_q, m_p, r, reg=1e-1, sigma=1.0, x_s=250, sampler='cholesky', apq_estimator='eig',
+                 slq_probes=10, slq_steps=30):
         super(GWI, self).__init__()
         self.r = r
+        self.sampler = sampler
+        self.apq_estimator = apq_estimator
+        self.slq_probes = slq_probes
+        self.slq_steps = slq_steps
         self.m_q = m_q
         self.sigma = sigma
         self.k = self.r.k
@@ -179,6 +261,8 @@ class GWI(torch.nn.Module):
 
     def get_APQ(self, batch_X, Z_prime, T=None):
         X = batch_X
+        if self.apq_estimator == 'slq':
+            return self.get_APQ_slq(X, Z_prime, T)
         rk_hat = 1 / X.shape[0] * self.r(Z_prime, X) @ self.k(X, Z_prime).evaluate()  # self.r.rk(X)/
         if T is not None:
             rk_hat = T * rk_hat
@@ -189,6 +273,20 @@ class GWI(torch.nn.Module):
         res = torch.sum(eigs ** 0.5) / self.x_s ** 0.5
         return res
 
+    def get_APQ_slq(self, X, Z_prime, T=None):
+        # Same term as get_APQ on the symmetrised 1/2(rk_hat + rk_hat^T), which is never formed: matvecs go through
+        # the x_s x n factors r(Z',X) and k(X,Z'), so x_s can grow without the cubic eigensolver.
+        r_zx = self.r(Z_prime, X) / X.shape[0]
+        k_xz = self.k(X, Z_prime).evaluate()
+        if T is not None:
+            r_zx = T * r_zx
+
+        def matvec(v):
+            return 0.5 * (r_zx @ (k_xz @ v) + k_xz.t() @ (r_zx.t() @ v))
+
+        res = slq_trace_sqrt(matvec, Z_prime.shape[0], self.slq_probes, self.slq_steps, X.device, r_zx.dtype)
+        return res / self.x_s ** 0.5
+
     def get_APQ_diagnose_xs(self, batch_X, Z_prime):
         X = batch_X
         rk_hat = 1 / X.shape[0] * self.r(Z_prime, X) @ self.k(X, Z_prime).evaluate()  # self.r.rk(X)/
@@ -215,17 +313,21 @@ class GWI(torch.nn.Module):
                 posterior = posterior * T
         return posterior ** 0.5
 
+    def sample_r(self, x):
+        # One correlated sample of the GP part at x, 'cholesky' is exact, 'low_rank' see r_param_cholesky_scaling.sample
+        if self.sampler == 'low_rank':
+            return self.r.sample(x)
+        return torch.linalg.cholesky(self.r(x)) @ torch.randn(x.shape[0], 1, device=x.device, dtype=x.dtype)
+
     def survival_likelihood(self, X, X_f, y, y_f, x_cat, x_cat_f, mask):
         x_concat_S = torch.cat([X[~mask],y[~mask]],dim=1)
-        cov_mat_S = self.r(x_concat_S)
-        L_S = torch.cholesky(cov_mat_S) @ torch.randn_like(y[~mask])
+        L_S = self.sample_r(x_concat_S)
         S, h_S = self.m_q.forward_S(X, y, mask, x_cat,L_S)
         if S.numel() == 0:
             S = S.detach()
         y_f = torch.autograd.Variable(y_f, requires_grad=True)
         x_concat_f = torch.cat([X_f,y_f],dim=1)
-        cov_mat_f = self.r(x_concat_f)
-        L_f = torch.linalg.cholesky(cov_mat_f)@ torch.randn_like(y_f)
+        L_f = self.sample_r(x_concat_f)
         f, h_f = self.m_q.forward_f(X_f, y_f, x_cat_f,L_f)
         if f.numel() == 0:
             f = f.detach()
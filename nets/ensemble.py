@@ -0,0 +1,100 @@
+import copy
+import torch
+from torch.func import functional_call,stack_module_state,vmap,jvp
+from nets.nets import survival_net_basic
+
+class _member_functions(torch.nn.Module):
+    #One survival_net_basic seen through functional_call. Only vmappable ops are used: softplus instead of the
+    #Log1PlusExp autograd.Function, a forward mode jvp for dh/dt instead of torch.autograd.grad, and the event mask
+    #is applied with torch.where so every member keeps the same shapes under per member batches.
+    def __init__(self,net):
+        super(_member_functions, self).__init__()
+        self.net = net
+
+    def h_dh(self,x_cov,y):
+        if self.net.direct=='analytic':
+            return self.net.middle_net_dt(x_cov,y)
+        return jvp(lambda t: self.net.middle_net((x_cov,t)),(y,),(torch.ones_like(y),))
+
+    def loss(self,x_cov,y,delta,x_cat=[]):
+        x_cov = self.net.covariate_net((x_cov,x_cat))
+        h,dh = self.h_dh(x_cov,y)
+        mask = (delta==1).unsqueeze(-1)
+        if self.net.objective in ['hazard','hazard_mean']:
+            log_hazard = (torch.sigmoid(h)*dh+1e-6).log()
+            loss = -(torch.where(mask,log_hazard,torch.zeros_like(h)).sum()-torch.nn.functional.softplus(h).sum())
+        else:
+            F = h.sigmoid()
+            log_f = (dh*F*(1-F)+1e-6).log()
+            loss = -torch.where(mask,log_f,-torch.nn.functional.softplus(h)).sum()
+        if self.net.objective in ['hazard_mean','S_mean']:
+            loss = loss/h.shape[0]
+        return loss
+
+    def S_grid(self,x_cov,time_grid,x_cat=[]):
+        x_cov = self.net.covariate_net((x_cov,x_cat))
+        h = self.net.middle_net((x_cov,time_grid,True)).squeeze(-1)
+        if self.net.objective in ['hazard','hazard_mean']:
+            S = torch.exp(-torch.nn.functional.softplus(h))
+        else:
+            S = 1-h.sigmoid()
+        return S.t()
+
+    def forward(self,mode,*args):
+        return getattr(self,mode)(*args)
+
+class survival_net_ensemble(torch.nn.Module):
+    #K survival_net_basic members with the parameters stacked along a leading member dimension, so one vmapped
+    #forward/backward trains all of them. Member k is initialised with torch.manual_seed(seeds[k]), its losses and
+    #gradients never mix with the other members, and summing the member losses gives every member its own gradient.
+    def __init__(self,net_init_params,seeds):
+        super(survival_net_ensemble, self).__init__()
+        self.net_init_params = net_init_params
+        self.seeds = list(seeds)
+        self.K = len(self.seeds)
+        members = []
+        for seed in self.seeds:
+            torch.manual_seed(seed)
+            members.append(survival_net_basic(**net_init_params))
+        params,buffers = stack_module_state(members)
+        self.param_names = list(params.keys())
+        self.stacked_params = torch.nn.ParameterList([torch.nn.Parameter(params[n]) for n in self.param_names])
+        self.buffer_names = list(buffers.keys())
+        for i,n in enumerate(self.buffer_names):
+            self.register_buffer(f'stacked_buffer_{i}',buffers[n],persistent=False)
+        #The meta copy only provides the code path, it is kept out of the module tree (no parameters, no state_dict)
+        self.__dict__['base'] = _member_functions(copy.deepcopy(members[0]).to('meta'))
+
+    def stacked_state(self):
+        params = {f'net.{n}':p for n,p in zip(self.param_names,self.stacked_params)}
+        buffers = {f'net.{n}':getattr(self,f'stacked_buffer_{i}') for i,n in enumerate(self.buffer_names)}
+        return params,buffers
+
+    def vmap_members(self,mode,data,data_dim):
+        #data_dim=0 when every member gets its own batch (leading dim K), None when all members share the data
+        params,buffers = self.stacked_state()
+        has_cat = not isinstance(data[-1],list)
+        if not has_cat:
+            data = data[:-1]
+        def member(params,buffers,*data):
+            return functional_call(self.base,(params,buffers),(mode,)+data)
+        in_dims = (0,0)+(data_dim,)*len(data)
+        return vmap(member,in_dims=in_dims,randomness='different')(params,buffers,*data)
+
+    def loss(self,x_cov,y,delta,x_cat=[]):
+        '''Per member training loss, shape (K,). Inputs carry a leading member dimension.'''
+        return self.vmap_members('loss',(x_cov,y,delta,x_cat),0)
+
+    def member_S_eval_grid(self,x_cov,time_grid,x_cat=[]):
+        '''Survival curves of every member on a shared time grid, shape (K,grid_size,n).'''
+        return self.vmap_members('S_grid',(x_cov,time_grid,x_cat),None)
+
+    def forward_S_eval_grid(self,x_cov,time_grid,x_cat=[]):
+        '''Ensemble mean survival curves, (grid_size,n) like survival_net_basic.forward_S_eval_grid.'''
+        return self.member_S_eval_grid(x_cov,time_grid,x_cat).mean(0)
+
+    def member(self,k):
+        '''Member k as a standalone survival_net_basic.'''
+        net = survival_net_basic(**self.net_init_params)
+        net.load_state_dict({n:p[k].detach() for n,p in zip(self.param_names,self.stacked_params)})
+        return net.to(self.stacked_params[0].device)
@@ -51,36 +51,107 @@ class multi_input_Sequential_res_net(torch.nn.Sequential):
                 inputs = module(*inputs)
             else:
                 output = module(inputs)
-                if inputs.shape[1]==output.shape[1]:
+                if inputs.shape[-1]==output.shape[-1]:
                     inputs = inputs+output
                 else:
                     inputs = output
         return inputs
 
 log1plusexp = Log1PlusExp.apply
+
+def transformation_derivative(f,x,y):
+    #Elementwise derivative of the transformation f at x, where y=f(x). Used for the analytic time derivative.
+    if f in [torch.tanh,torch.nn.functional.tanh]:
+        return 1-y**2
+    elif f in [torch.sigmoid,torch.nn.functional.sigmoid]:
+        return y*(1-y)
+    elif f in [torch.relu,torch.nn.functional.relu]:
+        return (x>0).type_as(x)
+    elif getattr(f,'__name__','')=='linear':
+        return torch.ones_like(x)
+    raise ValueError(f"No analytic derivative for transformation {f}, use direct_dif='autograd'")
+
+def bisect_monotone(func,target,t_lo,t_hi,n_iter=40,max_doublings=30):
+    #Batched bisection for func(t)=target with func increasing in t, all rows solved together.
+    #t_hi is doubled until it brackets the root, rows that never get there return inf.
+    #Rows with func(t_lo)>=target return t_lo.
+    finite = torch.isfinite(target)
+    for i in range(max_doublings):
+        below = (func(t_hi)<target) & finite
+        if not below.any():
+            break
+        t_hi = torch.where(below,t_hi*2,t_hi)
+    unreached = func(t_hi)<target
+    reached_lo = func(t_lo)>=target
+    for i in range(n_iter):
+        t_mid = (t_lo+t_hi)/2
+        below = func(t_mid)<target
+        t_lo = torch.where(below,t_mid,t_lo)
+        t_hi = torch.where(below,t_hi,t_mid)
+    t = torch.where(reached_lo,t_lo,t_hi)
+    return t.masked_fill(unreached,float('inf'))
+
+class categorical_embedding(torch.nn.Module):
+    #Embeddings of all categorical columns in one (sum(el), max(col_size)) table. Column i owns rows
+    #row_offset_i..row_offset_i+el_i-1 and uses the first col_size_i entries of a row, so one lookup returns every column
+    #and a fixed selection of positions gives their concatenation. Categories outside [0,el_i) are sent to a row past the
+    #table, so the lookup raises like a per column Embedding would, without python control flow (works under vmap).
+    def __init__(self,cat_size_list):
+        super(categorical_embedding, self).__init__()
+        self.cat_size_list = list(cat_size_list)
+        self.latent_col_list = [el//2+2 for el in self.cat_size_list]
+        self.d_cat = sum(self.latent_col_list)
+        self.max_width = max(self.latent_col_list)
+        self.weight = torch.nn.Parameter(torch.randn(sum(self.cat_size_list),self.max_width))
+        row_offset = [sum(self.cat_size_list[:i]) for i in range(len(self.cat_size_list))]
+        positions = torch.cat([i*self.max_width+torch.arange(col_size) for i,col_size in enumerate(self.latent_col_list)])
+        self.register_buffer('cat_sizes',torch.tensor(self.cat_size_list),persistent=False)
+        self.register_buffer('row_offset',torch.tensor(row_offset),persistent=False)
+        self.register_buffer('positions',positions,persistent=False)
+
+    def convert_state_dict(self,state_dict,prefix,module_prefix):
+        #Older layouts: per column embedding_{i}.weight [el, col_size] on the owning module, or a flat
+        #[sum(el*col_size), 1] table with column blocks stored row major
+        keys = [f'{module_prefix}embedding_{i}.weight' for i in range(len(self.cat_size_list))]
+        if keys[0] in state_dict:
+            blocks = [state_dict.pop(k) for k in keys]
+        elif state_dict.get(f'{prefix}weight',self.weight).shape[-1]==1 and self.max_width>1:
+            flat = state_dict[f'{prefix}weight'].reshape(-1)
+            sizes = [el*col_size for el,col_size in zip(self.cat_size_list,self.latent_col_list)]
+            blocks = [b.reshape(el,col_size) for b,el,col_size in zip(flat.split(sizes),self.cat_size_list,self.latent_col_list)]
+        else:
+            return
+        state_dict[f'{prefix}weight'] = torch.cat([torch.nn.functional.pad(b,(0,self.max_width-b.shape[1])) for b in blocks])
+
+    def forward(self,x_cat):
+        x_cat = x_cat.long()
+        valid = (x_cat>=0)&(x_cat<self.cat_sizes)
+        rows = torch.where(valid,self.row_offset+x_cat,torch.full_like(x_cat,self.weight.shape[0]))
+        return torch.nn.functional.embedding(rows,self.weight).flatten(-2)[...,self.positions]
+
 class nn_node(torch.nn.Module): #Add dropout layers, Do embedding layer as well!
     def __init__(self,d_in,d_out,cat_size_list,dropout=0.1,transformation=torch.tanh):
         super(nn_node, self).__init__()
 
         self.has_cat = len(cat_size_list)>0
-        self.latent_col_list = []
+        self.d_in = d_in
         print('cat_size_list',cat_size_list)
-        for i,el in enumerate(cat_size_list):
-            col_size = el//2+2
-            setattr(self,f'embedding_{i}',torch.nn.Embedding(el,col_size))
-            self.latent_col_list.append(col_size)
-        self.w = torch.nn.Linear(d_in+sum(self.latent_col_list),d_out)
+        self.d_cat = 0
+        if self.has_cat:
+            self.cat_embedding = categorical_embedding(cat_size_list)
+            self.d_cat = self.cat_embedding.d_cat
+            self._register_load_state_dict_pre_hook(self._load_old_embeddings)
+        self.w = torch.nn.Linear(d_in+self.d_cat,d_out)
         self.f = transformation
         self.dropout = torch.nn.Dropout(dropout)
         self.lnorm = torch.nn.LayerNorm(d_out)
+
+    def _load_old_embeddings(self,state_dict,prefix,*args):
+        self.cat_embedding.convert_state_dict(state_dict,f'{prefix}cat_embedding.',prefix)
+
     def forward(self,X,x_cat=[]):
         if not isinstance(x_cat,list):
-            seq = torch.unbind(x_cat,1)
-            cat_vals = [X]
-            for i,f in enumerate(seq):
-                o = getattr(self,f'embedding_{i}')(f)
-                cat_vals.append(o)
-            X = torch.cat(cat_vals,dim=1)
+            X = torch.cat([X,self.cat_embedding(x_cat)],dim=1)
         return self.dropout(self.f(self.lnorm(self.w(X))))
 
 
@@ -95,6 +166,12 @@ class bounded_nn_layer(torch.nn.Module): #Add dropout layers
     def forward(self,X):
         return self.f(X@self.bounding_op(self.W)+self.bias)
 
+    def forward_dt(self,X,dX):
+        W = self.bounding_op(self.W)
+        pre = X@W+self.bias
+        out = self.f(pre)
+        return out,transformation_derivative(self.f,pre,out)*(dX@W)
+
 class bounded_nn_layer_last(torch.nn.Module):  # Add dropout layers
     def __init__(self, d_in, d_out, bounding_op, transformation=torch.tanh):
         super(bounded_nn_layer_last, self).__init__()
@@ -106,6 +183,10 @@ class bounded_nn_layer_last(torch.nn.Module):  # Add dropout layers
     def forward(self, X):
         return X @ self.bounding_op(self.W) + self.bias
 
+    def forward_dt(self,X,dX):
+        W = self.bounding_op(self.W)
+        return X @ W + self.bias,dX @ W
+
 
 class unbounded_nn_layer(torch.nn.Module): #Add dropout layers
     def __init__(self, d_in, d_out, bounding_op, transformation=torch.tanh,dropout=0.1):
@@ -162,11 +243,25 @@ class mixed_layer_2(torch.nn.Module): #Add dropout layers
         self.bias = torch.nn.Parameter(torch.randn(d_out//2)/d_out**0.5, requires_grad=True)
         self.w = torch.nn.Linear(d_in,d_out//2)
 
-    def forward(self,X,x_bounded):
+    def forward(self,X,x_bounded,grid=False):
         bounded_part = x_bounded @ self.bounding_op(self.pos_weights) + self.bias
         regular_part = self.w(X)
+        if grid: #X is (n,d) and x_bounded a shared (grid_size,d_y) time grid, output is (n,grid_size,d_out)
+            n,grid_size = regular_part.shape[0],bounded_part.shape[0]
+            bounded_part = bounded_part.unsqueeze(0).expand(n,-1,-1)
+            regular_part = regular_part.unsqueeze(1).expand(-1,grid_size,-1)
+            return self.f(torch.cat([bounded_part,regular_part],dim=-1))
         return self.f( torch.cat([bounded_part,regular_part],dim=1))
 
+    def forward_dt(self,X,x_bounded): #(h,dh/dt) where only the bounded part depends on t
+        W = self.bounding_op(self.pos_weights)
+        bounded_part = x_bounded @ W + self.bias
+        regular_part = self.w(X)
+        pre = torch.cat([bounded_part,regular_part],dim=1)
+        d_pre = torch.cat([torch.ones_like(x_bounded) @ W,torch.zeros_like(regular_part)],dim=1)
+        out = self.f(pre)
+        return out,transformation_derivative(self.f,pre,out)*d_pre
+
 
 class survival_net_basic(torch.nn.Module):
     def __init__(self,
@@ -215,6 +310,19 @@ class survival_net_basic(torch.nn.Module):
             bounded_nn_layer_last(d_in=layers[-1], d_out=d_out, bounding_op=bounding_op, transformation=linear))
         self.middle_net = multi_input_Sequential_res_net(*module_list)
 
+    def middle_net_dt(self,x_cov,y):
+        #Forward mode pass through middle_net that carries (h,dh/dt) with the chain rule, so f is exact
+        #without a double backward graph. Mirrors the skip connections of multi_input_Sequential_res_net.
+        modules = list(self.middle_net._modules.values())
+        h,dh = modules[0].forward_dt(x_cov,y)
+        for module in modules[1:]:
+            out,d_out = module.forward_dt(h,dh)
+            if h.shape[-1]==out.shape[-1]:
+                h,dh = h+out,dh+d_out
+            else:
+                h,dh = out,d_out
+        return h,dh
+
     def forward(self,x_cov,y,x_cat=[]):
         return self.f(x_cov,y,x_cat)
 
@@ -232,6 +340,11 @@ class survival_net_basic(torch.nn.Module):
         return -log1plusexp(h)
 
     def forward_f(self,x_cov,y,x_cat=[]): #Figure out how to zero out grad
+        if self.direct=='analytic':
+            x_cov = self.covariate_net((x_cov,x_cat))
+            h,dh = self.middle_net_dt(x_cov,y)
+            F = h.sigmoid()
+            return (dh*F*(1-F)+1e-6).log()
         y = torch.autograd.Variable(y,requires_grad=True)
         x_cov = self.covariate_net((x_cov,x_cat))
         h = self.middle_net((x_cov, y))
@@ -263,6 +376,10 @@ class survival_net_basic(torch.nn.Module):
         return log1plusexp(h)
 
     def forward_hazard(self, x_cov, y,x_cat=[]):
+        if self.direct=='analytic':
+            x_cov = self.covariate_net((x_cov,x_cat))
+            h,dh = self.middle_net_dt(x_cov,y)
+            return torch.sigmoid(h)*dh
         y = torch.autograd.Variable(y,requires_grad=True)
         x_cov = self.covariate_net((x_cov,x_cat))
         h = self.middle_net((x_cov,y))
@@ -285,6 +402,64 @@ class survival_net_basic(torch.nn.Module):
             )
         return hazard
 
+    def time_derivative(self,out,y):
+        d, = torch.autograd.grad(
+            outputs=[out],
+            inputs=[y],
+            grad_outputs=torch.ones_like(out),
+            retain_graph=True,
+            create_graph=True,
+            only_inputs=True,
+            allow_unused=True
+        )
+        if d is None:
+            return torch.zeros_like(y)
+        return d
+
+    def forward_train(self,x_cov,y,mask,x_cat=[]):
+        #Fused version of forward_cum and forward: the covariate net runs once over the whole batch and the
+        #time derivative is only taken for the event rows. Returns (S,f) ready for the training objective.
+        x_cov = self.covariate_net((x_cov,x_cat))
+        if self.direct=='analytic':
+            h,dh = self.middle_net_dt(x_cov,y)
+            dh_f = dh[mask,:]
+        elif self.direct in ['full','semi']:
+            h = self.middle_net((x_cov,y))
+        else:
+            #Event and censored rows take separate middle_net passes and only the event rows see a y that requires
+            #grad, so the double backward of the time derivative stays on the event subset
+            y_f = y[mask,:].detach().requires_grad_(True)
+            h_events = self.middle_net((x_cov[mask,:],y_f))
+            h = h_events.new_empty(x_cov.shape[0],h_events.shape[1])
+            h[mask] = h_events
+            h[~mask] = self.middle_net((x_cov[~mask,:],y[~mask,:]))
+        h_f = h[mask,:]
+        if self.direct in ['full','semi']:
+            h_forward = self.middle_net((x_cov[mask,:], y[mask,:] + self.eps))
+        if self.objective in ['hazard','hazard_mean']:
+            H = log1plusexp(h)
+            if self.direct=='full':
+                hazard = (log1plusexp(h_forward) - H[mask,:]) / self.eps
+            elif self.direct == 'semi':
+                hazard = torch.sigmoid(h_f) * ((h_forward - h_f) / self.eps)
+            elif self.direct == 'analytic':
+                hazard = torch.sigmoid(h_f) * dh_f
+            else:
+                hazard = self.time_derivative(H[mask,:],y_f)
+            return H,hazard
+        elif self.objective in ['S','S_mean']:
+            S = -log1plusexp(h[~mask,:])
+            F = h_f.sigmoid()
+            if self.direct=='full':
+                f = (h_forward.sigmoid() - F) / self.eps
+            elif self.direct=='semi':
+                f = ((h_forward - h_f) / self.eps)*F*(1-F)
+            elif self.direct=='analytic':
+                f = dh_f*F*(1-F)
+            else:
+                f = self.time_derivative(F,y_f)
+            return S,(f+1e-6).log()
+
     def forward_S_eval(self,x_cov,y,x_cat=[]):
         if self.objective in ['hazard','hazard_mean']:
             S = torch.exp(-self.forward_cum_hazard(x_cov, y, [],x_cat))
@@ -294,6 +469,30 @@ class survival_net_basic(torch.nn.Module):
             h = self.middle_net((x_cov, y))
             return 1-h.sigmoid_()
 
+    def predict_quantile(self,x_cov,x_cat,p_list,t_max=1.,n_iter=40):
+        #Times t_p with F(t_p)=p for every individual and every p, in the (normalized) time scale of y.
+        #F is monotone in t through h, and F=p is h=logit(p) for both objectives, so all (individual,p) pairs are
+        #solved together by bisection on h with the covariate net run once. Returns (n,len(p_list)), inf if F stays below p.
+        p = torch.tensor(p_list,dtype=x_cov.dtype,device=x_cov.device)
+        with torch.no_grad():
+            x_cov = self.covariate_net((x_cov,x_cat)).repeat_interleave(len(p_list),0)
+            target = torch.logit(p).repeat(x_cov.shape[0]//len(p_list)).unsqueeze(-1)
+            t_lo = torch.zeros_like(target)
+            t_hi = torch.full_like(target,t_max)
+            t = bisect_monotone(lambda t: self.middle_net((x_cov,t)),target,t_lo,t_hi,n_iter=n_iter)
+        return t.view(-1,len(p_list))
+
+    def forward_S_eval_grid(self,x_cov,time_grid,x_cat=[]):
+        #Covariate net runs once per individual, only its embedding is broadcast against the time grid.
+        #Returns S with shape (grid_size,n), i.e. the layout EvalSurv expects.
+        x_cov = self.covariate_net((x_cov,x_cat))
+        h = self.middle_net((x_cov,time_grid,True)).squeeze(-1)
+        if self.objective in ['hazard','hazard_mean']:
+            S = torch.exp(-log1plusexp(h))
+        elif self.objective in ['S','S_mean']:
+            S = 1-h.sigmoid()
+        return S.t()
+
 class survival_GWI(survival_net_basic):
     def __init__(self,
                  d_in_x,
@@ -465,6 +664,28 @@ class weibull_net(torch.nn.Module):
 
         return (f+1e-6).log()
 
+    def forward_train(self,x_cov,y,mask,x_cat=[]):
+        #Fused version of forward_cum and forward, see survival_net_basic.forward_train
+        y = torch.autograd.Variable(y,requires_grad=True)
+        x_cov = self.covariate_net((x_cov,x_cat))
+        cat_dat = torch.cat([x_cov,y],dim=1)
+        a = self.a_net(cat_dat)
+        b = self.b_net(cat_dat)
+        S = self.S_func(y,a,b)
+        F = 1-S[mask,:]
+        f, = torch.autograd.grad(
+            outputs=[F],
+            inputs=[y],
+            grad_outputs=torch.ones_like(F),
+            retain_graph=True,
+            create_graph=True,
+            only_inputs=True,
+            allow_unused=True
+        )
+        if f is None:
+            f = torch.zeros_like(y)
+        return (S[~mask,:]+1e-6).log(),(f[mask,:]+1e-6).log()
+
     def forward_S_eval(self,x_cov,y,x_cat=[]):
         x_cov = self.covariate_net((x_cov, x_cat))
         cat_dat = torch.cat([x_cov,y],dim=1)
@@ -473,6 +694,18 @@ class weibull_net(torch.nn.Module):
         S = self.S_func(y,a,b)
         return S
 
+    def forward_S_eval_grid(self,x_cov,time_grid,x_cat=[]):
+        #Covariate net runs once per individual, only its embedding is repeated over the time grid.
+        #Returns S with shape (grid_size,n)
+        x_cov = self.covariate_net((x_cov, x_cat))
+        grid_size = time_grid.shape[0]
+        y = time_grid.repeat((x_cov.shape[0],1))
+        cat_dat = torch.cat([x_cov.repeat_interleave(grid_size,0),y],dim=1)
+        a = self.a_net(cat_dat)
+        b = self.b_net(cat_dat)
+        S = self.S_func(y,a,b)
+        return S.view(-1,grid_size).t()
+
 class lognormal_net(weibull_net):
     def __init__(self, d_in_x,
                  cat_size_list,
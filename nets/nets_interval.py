@@ -1,4 +1,5 @@
 import torch
+from nets.nets import categorical_embedding
 
 class Log1PlusExp(torch.autograd.Function):
     """Implementation of x ↦ log(1 + exp(x))."""
@@ -60,27 +61,23 @@ class nn_node(torch.nn.Module): #Add dropout layers, Do embedding layer as well!
         super(nn_node, self).__init__()
 
         self.has_cat = len(cat_size_list)>0
-        self.latent_col_list = []
         print('cat_size_list',cat_size_list)
-        for i,el in enumerate(cat_size_list):
-            col_size = el//2+2
-            setattr(self,f'embedding_{i}',torch.nn.Embedding(el,col_size))
-            self.latent_col_list.append(col_size)
-        self.w = torch.nn.Linear(d_in+sum(self.latent_col_list),d_out)
+        d_cat = 0
+        if self.has_cat:
+            self.cat_embedding = categorical_embedding(cat_size_list)
+            d_cat = self.cat_embedding.d_cat
+            self._register_load_state_dict_pre_hook(self._load_old_embeddings)
+        self.w = torch.nn.Linear(d_in+d_cat,d_out)
         self.f = transformation
         self.dropout = torch.nn.Dropout(dropout)
 
+    def _load_old_embeddings(self,state_dict,prefix,*args):
+        self.cat_embedding.convert_state_dict(state_dict,f'{prefix}cat_embedding.',prefix)
+
     def forward(self,X,x_cat=[]):
         if not isinstance(x_cat,list):
-            seq = torch.unbind(x_cat,1)
-            if not isinstance(X, list):
-                cat_vals = [X]
-            else:
-                cat_vals = []
-            for i,f in enumerate(seq):
-                o = getattr(self,f'embedding_{i}')(f)
-                cat_vals.append(o)
-            X = torch.cat(cat_vals,dim=1)
+            cat_vals = self.cat_embedding(x_cat)
+            X = cat_vals if isinstance(X, list) else torch.cat([X,cat_vals],dim=1)
         return self.dropout(self.f(self.w(X)))
 
 class bounded_nn_layer(torch.nn.Module): #Add dropout layers
@@ -1,6 +1,10 @@
 from serious_run import *
 from astropy.table import Table
 from utils.hazard_model_likelihood import *
+import torchtuples as tt
+from pycox_local.pycox.models import CoxPH,CoxCC,CoxTime,DeepHitSingle
+from pycox_local.pycox.models.cox_time import MLPVanillaCoxTime,MixedInputMLPCoxTime
+from utils.deephit_transformation_fix import LabTransDiscreteTime
 DURS = [50, 100, 200, 400]
 
 def sumo_loop(model,dataloader,device='cuda:0',grid_size=100):
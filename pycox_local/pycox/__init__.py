@@ -6,9 +6,18 @@ __author__ = """Haavard Kvamme"""
 __email__ = 'haavard.kvamme@gmail.com'
 __version__ = '0.2.2'
 
-import pycox_local.pycox.datasets
-import pycox_local.pycox.evaluation
-import pycox_local.pycox.preprocessing
-import pycox_local.pycox.simulations
-import pycox_local.pycox.utils
-import pycox_local.pycox.models
+import importlib
+
+# Submodules are imported on first access, so e.g. loading a dataset or evaluating does not import
+# torchtuples and every model.
+_submodules = ['datasets', 'evaluation', 'preprocessing', 'simulations', 'utils', 'models']
+
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + _submodules)
@@ -3,7 +3,6 @@
 
 import numpy as np
 import pandas as pd
-from pycox_local.pycox import simulations
 from pycox_local.pycox.datasets._dataset_loader import _DatasetLoader
 
 class _SimDataset(_DatasetLoader):
@@ -74,6 +73,7 @@ class _RRNLNPH(_SimDataset):
 
     def _simulate_data(self):
         np.random.seed(1234)
+        from pycox_local.pycox import simulations  # imports torchtuples, only needed to create the data
         sim = simulations.SimStudyNonLinearNonPH()
         data = sim.simulate(25000)
         df = sim.dict2df(data, True)
@@ -120,6 +120,7 @@ class _SAC3(_SimDataset):
 
     def _simulate_data(self):
         np.random.seed(1234)
+        from pycox_local.pycox import simulations
         sim = simulations.SimStudySACCensorConst()
         data = sim.simulate(100000)
         df = sim.dict2df(data, True, False)
@@ -162,6 +163,7 @@ class _SACAdmin5(_SimDataset):
 
     def _simulate_data(self):
         np.random.seed(1234)
+        from pycox_local.pycox import simulations
         sim = simulations.SimStudySACAdmin()
         data = sim.simulate(50000)
         df = sim.dict2df(data, True, True)
@@ -15,38 +15,38 @@ def administrative_scores(func):
         assert (durations[events == 0] == durations_c[events == 0]).all(), 'Censored observations need same `durations` and `durations_c`'
         assert (durations[events == 1] <= durations_c[events == 1]).all(), '`durations` cannot be larger than `durations_c`'
         idx_ts_surv = idx_at_times(index_surv, time_grid, steps_surv, assert_sorted=True)
-        scores, norm = _admin_scores(func, time_grid, durations, durations_c, events, surv, idx_ts_surv)
+        scores, norm = _admin_scores(func, time_grid, durations, durations_c, events, surv, idx_ts_surv, reduce is True)
         if reduce is True:
-            return scores.sum(axis=1) / norm
+            return scores[:, 0] / norm
         return scores, norm.reshape(-1, 1)
     return metric
 
-@numba.njit(parallel=True)
-def _admin_scores(func, time_grid, durations, durations_c, events, surv, idx_ts_surv):
-    def _single(func, ts, durations, durations_c, events, surv, idx_ts_surv_i,
-                scores, n_indiv):
-        for i in range(n_indiv):
-            tt = durations[i]
-            tc = durations_c[i]
-            d = events[i]
-            s = surv[idx_ts_surv_i, i]
-            scores[i] = func(ts, tt, tc, d, s)
-
+@numba.njit(parallel=True, cache=True)
+def _admin_scores(func, time_grid, durations, durations_c, events, surv, idx_ts_surv, reduce):
+    # With `reduce` only the sums over individuals are kept, scores is [n_times, 1] and memory is O(n_times),
+    # otherwise scores is [n_times, n_indiv].
     n_times = len(time_grid)
     n_indiv = len(durations)
-    scores = np.empty((n_times, n_indiv))
-    scores.fill(np.nan)
-    normalizer = np.empty(n_times)
-    normalizer.fill(np.nan)
-    for i in numba.prange(n_times):
-        ts = time_grid[i]
-        idx_ts_surv_i = idx_ts_surv[i]
-        scores_i = scores[i]
-        normalizer[i] = (durations_c >= ts).sum()
-        _single(func, ts, durations, durations_c, events, surv, idx_ts_surv_i, scores_i, n_indiv)
+    scores = np.zeros((n_times, 1 if reduce else n_indiv))
+    normalizer = np.zeros(n_times)
+    for j in numba.prange(n_times):
+        ts = time_grid[j]
+        idx_ts_surv_j = idx_ts_surv[j]
+        score_sum = 0.
+        norm = 0.
+        for i in range(n_indiv):
+            score = func(ts, durations[i], durations_c[i], events[i], surv[idx_ts_surv_j, i])
+            if reduce:
+                score_sum += score
+            else:
+                scores[j, i] = score
+            norm += durations_c[i] >= ts
+        if reduce:
+            scores[j, 0] = score_sum
+        normalizer[j] = norm
     return scores, normalizer
 
-@numba.njit
+@numba.njit(cache=True)
 def _brier_score(ts, tt, tc, d, s):
     if (tt <= ts) and (d == 1) and (tc >= ts):
         return np.power(s, 2)
@@ -54,7 +54,7 @@ def _brier_score(ts, tt, tc, d, s):
         return np.power(1 - s, 2)
     return 0.
 
-@numba.njit
+@numba.njit(cache=True)
 def _binomial_log_likelihood(ts, tt, tc, d, s, eps=1e-7):
     if s < eps:
         s = eps
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+from pycox_local.pycox import utils
+from pycox_local.pycox.evaluation.concordance import _count_comparable_sorted
+from pycox_local.pycox.evaluation.ipcw import inv_cens_scores, _brier_score, _binomial_log_likelihood
+
+
+class EvalContext:
+    """The parts of evaluating one data split that do not depend on the predictions.
+    Build it once per split and reuse it at every checkpoint, e.g. with `StreamingEvalSurv`.
+
+    Holds the Kaplan-Meier censoring estimates G(t-) at each duration and G(t) at each point
+    of `time_grid`, the sums of the inverse censoring weights at each point of `time_grid`,
+    the lookups from durations and `time_grid` to rows of the predictions, and the number of
+    comparable pairs of the concordance.
+    The weights are the same as in `ipcw` with `censor_surv='km'`.
+
+    Arguments:
+        durations {np.array} -- Durations of the split.
+        events {np.array} -- Events of the split.
+        index_surv {np.array} -- Times of the rows of the survival predictions.
+        time_grid {np.array} -- Durations where the Brier score and log-likelihood are calculated.
+
+    Keyword Arguments:
+        max_weight {float} -- Max weight value (max number of individuals an individual
+            can represent (default {np.inf}).
+        steps {str} -- For durations between values of `index_surv` choose the higher index 'pre'
+            or lower index 'post'. See `EvalSurv.steps`. (default: {'post'})
+    """
+    def __init__(self, durations, events, index_surv, time_grid, max_weight=np.inf, steps='post'):
+        assert (type(durations) == type(events) == np.ndarray), 'Need `durations` and `events` to be arrays'
+        assert pd.Series(index_surv).is_monotonic_increasing
+        self.durations = durations
+        self.events = events
+        self.index_surv = index_surv
+        self.time_grid = time_grid
+        self.steps = steps
+        self.order = np.argsort(durations, kind='stable')
+        self.surv_idx = utils.idx_at_times(index_surv, durations, steps)
+        self.idx_ts_surv = utils.idx_at_times(index_surv, time_grid, steps)
+
+        km = utils.kaplan_meier(durations, 1-events)
+        censor_surv, index_censor = km.values, km.index.values
+        min_g = 1./max_weight
+        self.max_weight = max_weight
+        self.censor_surv = censor_surv
+        self.idx_ts_censor = utils.idx_at_times(index_censor, time_grid, 'post')
+        self.idx_tt_censor = (utils.idx_at_times(index_censor, durations, 'pre') - 1).clip(0)  # G(tt-)
+        self.g_ts = np.maximum(censor_surv[self.idx_ts_censor], min_g)
+        self.g_tt = np.maximum(censor_surv[self.idx_tt_censor], min_g)
+
+        t_sorted = durations[self.order]
+        event_weight = np.concatenate([[0.], np.cumsum((events[self.order] == 1) / self.g_tt[self.order])])
+        n_le = np.searchsorted(t_sorted, time_grid, side='right')
+        # G(t) is 0 past the last censored duration, where no individual is left at risk to weight
+        n_gt = len(durations) - n_le
+        self.weight_sum = event_weight[n_le] + np.divide(n_gt, self.g_ts, out=np.zeros(len(n_gt)), where=n_gt > 0)
+        self._comparable = {}
+
+    def comparable(self, antolini=False):
+        """Number of comparable pairs, the denominator of the concordance."""
+        if antolini not in self._comparable:
+            t = self.durations[self.order]
+            d = self.events[self.order].astype('int64')
+            self._comparable[antolini] = _count_comparable_sorted(t, d, antolini)
+        return self._comparable[antolini]
+
+    def ipcw_sums(self, surv, index):
+        """Sums over the individuals `index` of the weighted Brier scores and binomial
+        log-likelihoods at each point of `time_grid`, as `ipcw.brier_score` and
+        `ipcw.binomial_log_likelihood` with `reduce=False`. Runs the kernel of `ipcw`.
+
+        Arguments:
+            surv {np.array} -- Survival predictions [n_times, len(index)] at `index_surv`.
+            index {np.array} -- Positions of the individuals in `durations`.
+        """
+        surv = np.ascontiguousarray(surv, dtype='float64')
+        args = (self.time_grid, self.durations[index], self.events[index], surv, self.censor_surv,
+                self.idx_ts_surv, self.idx_ts_censor, self.idx_tt_censor[index], self.max_weight)
+        brier, _ = inv_cens_scores(_brier_score, *args)
+        bll, _ = inv_cens_scores(_binomial_log_likelihood, *args)
+        return brier, bll
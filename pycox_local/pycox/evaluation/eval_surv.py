@@ -100,11 +100,21 @@ class EvalSurv:
     def add_km_censor(self, steps='post'):
         """Add censoring estimates obtained by Kaplan-Meier on the test set
         (durations, 1-events).
+        The Kaplan-Meier curve is the same for all individuals, so it is stored once
+        (see `SharedCensorSurv`) instead of as one identical column per individual.
         """
         km = utils.kaplan_meier(self.durations, 1-self.events)
-        surv = pd.DataFrame(np.repeat(km.values.reshape(-1, 1), len(self.durations), axis=1),
-                            index=km.index)
-        return self.add_censor_est(surv, steps)
+        surv = pd.DataFrame(km.values.reshape(-1, 1), index=km.index)
+        censor_surv = SharedCensorSurv(surv, self.durations, 1-self.events, None, steps=steps)
+        return self.add_censor_est(censor_surv, steps)
+
+    def _censor_surv_values(self):
+        """Censoring survival estimates as passed to `ipcw`. A 1d array if the censoring
+        curve is shared by all individuals, else [n_times, n_indiv].
+        """
+        if isinstance(self.censor_surv, SharedCensorSurv):
+            return self.censor_surv.surv.values[:, 0]
+        return self.censor_surv.surv.values
 
     @property
     def censor_durations(self):
@@ -168,7 +178,7 @@ class EvalSurv:
     # def prob_alive(self, time_grid):
     #     return self.surv_at_times(time_grid).values
 
-    def concordance_td(self, method='adj_antolini'):
+    def concordance_td(self, method='adj_antolini', engine='pairwise'):
         """Time dependent concorance index from
         Antolini, L.; Boracchi, P.; and Biganzoli, E. 2005. A time-dependent discrimination
         index for survival data. Statistics in Medicine 24:3927–3944.
@@ -183,12 +193,15 @@ class EvalSurv:
 
         Keyword Arguments:
             method {str} -- Type of c-index 'antolini' or 'adj_antolini' (default {'adj_antolini'}).
+            engine {str} -- 'pairwise' (O(n^2)) or the equivalent sort based 'sorted'
+                (O(K n log n) for K distinct rows). See 'concordance.concordance_td'
+                (default {'pairwise'}).
 
         Returns:
             float -- Time dependent concordance index.
         """
         return concordance_td(self.durations, self.events, self.surv.values,
-                              self._duration_idx(), method)
+                              self._duration_idx(), method, engine)
 
     def brier_score(self, time_grid, max_weight=np.inf):
         """Brier score weighted by the inverse censoring distribution.
@@ -210,7 +223,7 @@ class EvalSurv:
             raise ValueError("""Need to add censor_surv to compute Brier score. Use 'add_censor_est'
             or 'add_km_censor' for Kaplan-Meier""")
         bs = ipcw.brier_score(time_grid, self.durations, self.events, self.surv.values,
-                              self.censor_surv.surv.values, self.index_surv,
+                              self._censor_surv_values(), self.index_surv,
                               self.censor_surv.index_surv, max_weight, True, self.steps,
                               self.censor_surv.steps)
         return pd.Series(bs, index=time_grid).rename('brier_score')
@@ -235,7 +248,7 @@ class EvalSurv:
             raise ValueError("""Need to add censor_surv to compute the score. Use 'add_censor_est'
             or 'add_km_censor' for Kaplan-Meier""")
         bll = ipcw.binomial_log_likelihood(time_grid, self.durations, self.events, self.surv.values,
-                                           self.censor_surv.surv.values, self.index_surv,
+                                           self._censor_surv_values(), self.index_surv,
                                            self.censor_surv.index_surv, max_weight, True, self.steps,
                                            self.censor_surv.steps)
         return pd.Series(-bll, index=time_grid).rename('nbll')
@@ -254,7 +267,7 @@ class EvalSurv:
         if self.censor_surv is None:
             raise ValueError("Need to add censor_surv to compute briser score. Use 'add_censor_est'")
         return ipcw.integrated_brier_score(time_grid, self.durations, self.events, self.surv.values,
-                                           self.censor_surv.surv.values, self.index_surv,
+                                           self._censor_surv_values(), self.index_surv,
                                            self.censor_surv.index_surv, max_weight, self.steps,
                                            self.censor_surv.steps)
 
@@ -272,7 +285,7 @@ class EvalSurv:
         if self.censor_surv is None:
             raise ValueError("Need to add censor_surv to compute the score. Use 'add_censor_est'")
         ibll = ipcw.integrated_binomial_log_likelihood(time_grid, self.durations, self.events, self.surv.values,
-                                                       self.censor_surv.surv.values, self.index_surv,
+                                                       self._censor_surv_values(), self.index_surv,
                                                        self.censor_surv.index_surv, max_weight, self.steps,
                                                        self.censor_surv.steps)
         return -ibll
@@ -353,3 +366,23 @@ class EvalSurv:
                                                         self.events, self.surv.values, self.index_surv,
                                                         self.steps)
         return -ibll
+
+
+class SharedCensorSurv(EvalSurv):
+    """Censoring estimate where all individuals share one survival curve, e.g. Kaplan-Meier.
+    `surv` has a single column, so memory is O(n_times) instead of O(n_times * n_indiv).
+
+    Arguments:
+        surv {pd.DataFrame} -- Single column censoring survival curve.
+        durations {np.array} -- Durations of test set.
+        events {np.array} -- Censoring indicators of test set (1 - events).
+    """
+    def __init__(self, surv, durations, events, censor_surv=None, censor_durations=None, steps='post'):
+        assert surv.shape[1] == 1, 'Need `surv` to be a single shared curve'
+        super().__init__(surv, durations, events, censor_surv, censor_durations, steps)
+
+    def __getitem__(self, index):
+        if not (hasattr(index, '__iter__') or type(index) is slice) :
+            index = [index]
+        return SharedCensorSurv(self.surv, self.durations[index], self.events[index], None,
+                                steps=self.steps)
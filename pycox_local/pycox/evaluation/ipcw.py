@@ -3,33 +3,53 @@ import scipy
 import numba
 from pycox_local.pycox import utils
 
-@numba.njit(parallel=True)
+@numba.njit(parallel=True, cache=True)
 def _inv_cens_scores(func, time_grid, durations, events, surv, censor_surv, idx_ts_surv, idx_ts_censor,
-                     idx_tt_censor, scores, weights, n_times, n_indiv, max_weight):
-    def _inv_cens_score_single(func, ts, durations, events, surv, censor_surv, idx_ts_surv_i,
-                               idx_ts_censor_i, idx_tt_censor, scores, weights, n_indiv, max_weight):
-        min_g = 1./max_weight
+                     idx_tt_censor, scores, weights, max_weight, shared, reduce):
+    # Inverse censoring weighted scores at each point of `time_grid`.
+    # shared: `censor_surv` is one curve for all individuals (e.g. Kaplan-Meier) with shape [n_censor, 1],
+    #   instead of one column per individual.
+    # reduce: `scores` and `weights` are [n_times, 1] and get the sums over individuals, so memory is O(n_times),
+    #   instead of [n_times, n_indiv] with one entry per individual.
+    min_g = 1./max_weight
+    n_indiv = len(durations)
+    for j in numba.prange(len(time_grid)):
+        ts = time_grid[j]
+        score_sum = 0.
+        weight_sum = 0.
         for i in range(n_indiv):
-            tt = durations[i]
-            d = events[i]
-            s = surv[idx_ts_surv_i, i]
-            g_ts = censor_surv[idx_ts_censor_i, i]
-            g_tt = censor_surv[idx_tt_censor[i], i]
-            g_ts = max(g_ts, min_g)
-            g_tt = max(g_tt, min_g)
-            score, w = func(ts, tt, s, g_ts, g_tt, d)
+            c = 0 if shared else i
+            s = surv[idx_ts_surv[j], i]
+            g_ts = max(censor_surv[idx_ts_censor[j], c], min_g)
+            g_tt = max(censor_surv[idx_tt_censor[i], c], min_g)
+            score, w = func(ts, durations[i], s, g_ts, g_tt, events[i])
             #w = min(w, max_weight)
-            scores[i] = score * w
-            weights[i] = w
+            if reduce:
+                score_sum += score * w
+                weight_sum += w
+            else:
+                scores[j, i] = score * w
+                weights[j, i] = w
+        if reduce:
+            scores[j, 0] = score_sum
+            weights[j, 0] = weight_sum
 
-    for i in numba.prange(n_times):
-        ts = time_grid[i]
-        idx_ts_surv_i = idx_ts_surv[i]
-        idx_ts_censor_i = idx_ts_censor[i]
-        scores_i = scores[i]
-        weights_i = weights[i]
-        _inv_cens_score_single(func, ts, durations, events, surv, censor_surv, idx_ts_surv_i,
-                               idx_ts_censor_i, idx_tt_censor, scores_i, weights_i, n_indiv, max_weight)
+def inv_cens_scores(func, time_grid, durations, events, surv, censor_surv, idx_ts_surv, idx_ts_censor,
+                    idx_tt_censor, max_weight=np.inf, reduce=True):
+    """Runs `_inv_cens_scores` for a 1d (shared) or 2d `censor_surv` with the lookups already computed.
+    Returns (score_sums, weight_sums) of length n_times with `reduce`, else (scores, weights) [n_times, n_indiv].
+    """
+    shared = censor_surv.ndim == 1
+    if shared:
+        censor_surv = censor_surv.reshape(-1, 1)
+    n_cols = 1 if reduce else len(durations)
+    scores = np.zeros((len(time_grid), n_cols))
+    weights = np.zeros((len(time_grid), n_cols))
+    _inv_cens_scores(func, time_grid, durations, events, surv, censor_surv, idx_ts_surv, idx_ts_censor,
+                     idx_tt_censor, scores, weights, float(max_weight), shared, reduce)
+    if reduce:
+        return scores[:, 0], weights[:, 0]
+    return scores, weights
 
 def _inverse_censoring_weighted_metric(func):
     if not func.__class__.__module__.startswith('numba'):
@@ -40,24 +60,20 @@ def _inverse_censoring_weighted_metric(func):
             time_grid = np.array([time_grid])
         assert (type(time_grid) is type(durations) is type(events) is type(surv) is type(censor_surv) is
                 type(index_surv) is type(index_censor) is np.ndarray), 'Need all input to be np.ndarrays'
-        n_times = len(time_grid)
-        n_indiv = len(durations)
-        scores = np.zeros((n_times, n_indiv))
-        weights = np.zeros((n_times, n_indiv))
         idx_ts_surv = utils.idx_at_times(index_surv, time_grid, steps_surv, assert_sorted=True)
         idx_ts_censor = utils.idx_at_times(index_censor, time_grid, steps_censor, assert_sorted=True)
         idx_tt_censor = utils.idx_at_times(index_censor, durations, 'pre', assert_sorted=True)
         if steps_censor == 'post':
             idx_tt_censor  = (idx_tt_censor - 1).clip(0)
             #  This ensures that we get G(tt-)
-        _inv_cens_scores(func, time_grid, durations, events, surv, censor_surv, idx_ts_surv, idx_ts_censor,
-                         idx_tt_censor, scores, weights, n_times, n_indiv, max_weight)
+        scores, weights = inv_cens_scores(func, time_grid, durations, events, surv, censor_surv, idx_ts_surv,
+                                          idx_ts_censor, idx_tt_censor, max_weight, reduce is True)
         if reduce is True:
-            return np.sum(scores, axis=1) / np.sum(weights, axis=1)
+            return scores / weights
         return scores, weights
     return metric
 
-@numba.njit()
+@numba.njit(cache=True)
 def _brier_score(ts, tt, s, g_ts, g_tt, d):
     if (tt <= ts) and d == 1:
         return np.power(s, 2), 1./g_tt
@@ -65,7 +81,7 @@ def _brier_score(ts, tt, s, g_ts, g_tt, d):
         return np.power(1 - s, 2), 1./g_ts
     return 0., 0.
 
-@numba.njit()
+@numba.njit(cache=True)
 def _binomial_log_likelihood(ts, tt, s, g_ts, g_tt, d, eps=1e-7):
     s = eps if s < eps else s
     s = (1-eps) if s > (1 - eps) else s
@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+import scipy
+from pycox_local.pycox.evaluation.concordance import _sorted_concordant_count
+
+
+class StreamingEvalSurv:
+    """Evaluation of survival predictions that arrive batch by batch, so the full
+    [n_times, n_indiv] survival matrix is never held in memory.
+    Gives the same results as `EvalSurv(surv, durations, events, censor_surv='km')` for
+    `brier_score`, `nbll`, their integrated versions and `concordance_td`.
+
+    Batches have to be fed in order of increasing durations, e.g. by going through `order`.
+    Only the last tie group of a batch is held back (until the next batch), and for the
+    concordance we keep the prediction of each event at its own duration, so memory is
+    O(n_times * batch_size + n_indiv).
+
+    Arguments:
+        context {EvalContext} -- Prediction independent parts of the evaluation of the split
+            (durations, events, time grids, censoring weights). Can be shared by many evaluators.
+
+    Keyword Arguments:
+        method {str} -- Type of c-index 'antolini' or 'adj_antolini' (default {'adj_antolini'}).
+    """
+    def __init__(self, context, method='adj_antolini'):
+        if method not in ('adj_antolini', 'antolini'):
+            raise ValueError(f"Need 'method' to be 'antolini' or 'adj_antolini', got '{method}'.")
+        self.context = context
+        self.durations = context.durations
+        self.events = context.events
+        self.time_grid = context.time_grid
+        self.order = context.order
+        self.antolini = method == 'antolini'
+        self._brier_sum = np.zeros(len(self.time_grid))
+        self._bll_sum = np.zeros(len(self.time_grid))
+        self._concordant = 0.
+        self._event_surv = {} # row of surv -> sorted predictions of the events processed so far
+        self._pending = None
+        self._last_duration = -np.inf
+        self._n_seen = 0
+
+    def update(self, surv, index):
+        """Add survival predictions for a batch of individuals.
+
+        Arguments:
+            surv {np.array} -- Survival predictions [n_times, len(index)] at `index_surv`.
+            index {np.array} -- Positions of the individuals in `durations`, such that
+                `durations[index]` is sorted and not smaller than in earlier batches.
+        """
+        index = np.asarray(index)
+        if self._pending is not None:
+            surv = np.concatenate([self._pending[0], surv], axis=1)
+            index = np.concatenate([self._pending[1], index])
+            self._pending = None
+        t = self.durations[index]
+        if (np.diff(t) < 0).any() or (t[0] <= self._last_duration):
+            raise ValueError("Need batches in order of increasing durations. Use e.g. `order`.")
+        cut = np.searchsorted(t, t[-1], side='left')
+        self._pending = (surv[:, cut:], index[cut:])
+        if cut > 0:
+            self._process(surv[:, :cut], index[:cut])
+        return self
+
+    def _flush(self):
+        if self._pending is not None:
+            self._process(*self._pending)
+            self._pending = None
+        if self._n_seen != len(self.durations):
+            raise RuntimeError(f"Got predictions for {self._n_seen} of {len(self.durations)} individuals.")
+
+    def _process(self, surv, index):
+        # `index` holds complete tie groups, and all individuals with shorter durations are processed.
+        surv = np.ascontiguousarray(surv)
+        t = self.durations[index]
+        d = self.events[index]
+        brier, bll = self.context.ipcw_sums(surv, index)
+        self._brier_sum += brier
+        self._bll_sum += bll
+
+        # Events from earlier batches against this batch, evaluated on the row of the event.
+        for row, event_surv in self._event_surv.items():
+            lo = np.searchsorted(event_surv, surv[row], side='left')
+            self._concordant += lo.sum()
+            if not self.antolini:
+                hi = np.searchsorted(event_surv, surv[row], side='right')
+                self._concordant += 0.5 * (hi - lo).sum()
+        surv_idx = self.context.surv_idx[index]
+        self._concordant += _sorted_concordant_count(t, d, surv, surv_idx, self.antolini)
+        is_event = d == 1
+        for row in np.unique(surv_idx[is_event]):
+            new = surv[row, is_event & (surv_idx == row)]
+            self._event_surv[row] = np.sort(np.concatenate([self._event_surv.get(row, new[:0]), new]))
+        self._last_duration = t[-1]
+        self._n_seen += len(index)
+
+    def concordance_td(self):
+        """Time dependent concordance index, see `EvalSurv.concordance_td`."""
+        self._flush()
+        return self._concordant / self.context.comparable(self.antolini)
+
+    def brier_score(self):
+        """Brier score at `time_grid` weighted by the inverse Kaplan-Meier censoring distribution."""
+        self._flush()
+        return pd.Series(self._brier_sum / self.context.weight_sum, index=self.time_grid).rename('brier_score')
+
+    def nbll(self):
+        """Negative binomial log-likelihood at `time_grid` weighted by the inverse Kaplan-Meier
+        censoring distribution."""
+        self._flush()
+        return pd.Series(-self._bll_sum / self.context.weight_sum, index=self.time_grid).rename('nbll')
+
+    def integrated_brier_score(self):
+        """Integrated Brier score over `time_grid`, see `EvalSurv.integrated_brier_score`."""
+        integral = scipy.integrate.simps(self.brier_score().values, self.time_grid)
+        return integral / (self.time_grid[-1] - self.time_grid[0])
+
+    def integrated_nbll(self):
+        """Integrated negative binomial log-likelihood over `time_grid`, see `EvalSurv.integrated_nbll`."""
+        integral = scipy.integrate.simps(self.nbll().values, self.time_grid)
+        return integral / (self.time_grid[-1] - self.time_grid[0])
@@ -1,3 +1,4 @@
+import time
 import numpy as np
 import pandas as pd
 import torch
@@ -57,7 +58,26 @@ class CoxTime(models.cox_cc._CoxCCBase):
         return surv
 
     def compute_baseline_hazards(self, input=None, target=None, max_duration=None, sample=None, batch_size=8224,
-                                set_hazards=True, eval_=True, num_workers=0):
+                                set_hazards=True, eval_=True, num_workers=0, at_risk_sample=None, chunk_size=None,
+                                verbose=False):
+        """Breslow estimates of the baseline hazards, see `models.cox._CoxBase.compute_baseline_hazards`.
+
+        As g(x, t) depends on time, the at-risk sum at every event time needs its own pass over the at-risk set.
+        All (individual, event time) pairs are packed into calls to `predict` of `chunk_size` pairs.
+
+        Keyword Arguments:
+            at_risk_sample {int} -- If not None, estimate each at-risk sum from this many individuals drawn
+                (with replacement) from the at-risk set, rescaled by its size. This is unbiased, and
+                `at_risk_rel_se_` holds a plug-in estimate of the relative standard error of every sum
+                (the sample standard deviation of the drawn exp(g) values), which carries over to the
+                baseline hazard at that time and scales as 1/sqrt(at_risk_sample). It is an estimate,
+                not a bound: when exp(g) is skewed or heavy tailed, so that a few individuals dominate a
+                sum, the sample tends to miss them and both the sum and its standard error come out too
+                small. Use the exact sums (None) when the baseline hazard needs guaranteed accuracy.
+                (default: {None})
+            chunk_size {int} -- Number of pairs per call to `predict` (default: {16 * batch_size})
+            verbose {bool} -- Print progress and throughput in pairs per second. (default: {False})
+        """
         if (input is None) and (target is None):
             if not hasattr(self, 'training_data'):
                 raise ValueError('Need to fit, or supply a input and target to this function.')
@@ -70,21 +90,59 @@ class CoxTime(models.cox_cc._CoxCCBase):
                 df = df.sample(frac=sample)
             df = df.sort_values(self.duration_col)
         input = tt.tuplefy(input).to_numpy().iloc[df.index.values]
-        base_haz = self._compute_baseline_hazards(input, df, max_duration, batch_size, eval_, num_workers)
+        base_haz = self._compute_baseline_hazards(input, df, max_duration, batch_size, eval_, num_workers,
+                                                  at_risk_sample, chunk_size, verbose)
         if set_hazards:
             self.compute_baseline_cumulative_hazards(set_hazards=True, baseline_hazards_=base_haz)
         return base_haz
 
+    def _at_risk_sums(self, input, start, times, batch_size, eval_=True, num_workers=0, at_risk_sample=None,
+                      chunk_size=None, verbose=False):
+        """Sums of exp(g(x_i, times[j])) over the individuals i >= start[j] of `input` (sorted by duration).
+
+        Returns:
+            tuple -- The sums and plug-in estimates of their standard errors (zero where the sum is exact).
+                The estimates are unreliable for skewed exp(g), see `compute_baseline_hazards`.
+        """
+        chunk_size = 16 * batch_size if chunk_size is None else chunk_size
+        n = input.lens().flatten().get_if_all_equal()
+        start = np.asarray(start, dtype='int64')
+        times = np.asarray(times, dtype='float32')
+        n_risk = n - start
+        n_pairs = n_risk if at_risk_sample is None else np.minimum(n_risk, at_risk_sample)
+        sampled = n_pairs < n_risk
+        offset = np.concatenate([[0], np.cumsum(n_pairs)])
+        sums = np.zeros(len(times))
+        sums_sq = np.zeros(len(times))
+        tensor_input = input.type() is torch.Tensor
+        t_start = time.perf_counter()
+        for lo in range(0, offset[-1], chunk_size):
+            pos = np.arange(lo, min(lo + chunk_size, offset[-1]))
+            j = np.searchsorted(offset, pos, side='right') - 1
+            q = pos - offset[j]
+            if sampled.any():
+                q = np.where(sampled[j], (np.random.uniform(size=len(pos)) * n_risk[j]).astype('int64'), q)
+            rows = start[j] + q
+            t = times[j].reshape(-1, 1)
+            if tensor_input:
+                t = torch.from_numpy(t)
+            expg = np.exp(self.predict((input.iloc[rows], t), batch_size, True, eval_,
+                                       num_workers=num_workers)).flatten().astype('float64')
+            sums += np.bincount(j, expg, len(times))
+            sums_sq += np.bincount(j, expg**2, len(times))
+            if verbose:
+                elapsed = time.perf_counter() - t_start
+                print(pos[-1] + 1, 'of', offset[-1], 'pairs,', f"{(pos[-1] + 1) / elapsed:.0f} pairs/s")
+        n_pairs = np.maximum(n_pairs, 1)
+        mean = sums / n_pairs
+        var = np.maximum(sums_sq / n_pairs - mean**2, 0.)
+        se = np.where(sampled, n_risk * np.sqrt(var / n_pairs), 0.)
+        return mean * n_risk, se
+
     def _compute_baseline_hazards(self, input, df_train_target, max_duration, batch_size, eval_=True,
-                                  num_workers=0):
+                                  num_workers=0, at_risk_sample=None, chunk_size=None, verbose=False):
         if max_duration is None:
             max_duration = np.inf
-        def compute_expg_at_risk(ix, t):
-            sub = input.iloc[ix:]
-            n = sub.lens().flatten().get_if_all_equal()
-            t = np.repeat(t, n).reshape(-1, 1).astype('float32')
-            return np.exp(self.predict((sub, t), batch_size, True, eval_, num_workers=num_workers)).flatten().sum()
-
         if not df_train_target[self.duration_col].is_monotonic_increasing:
             raise RuntimeError(f"Need 'df_train_target' to be sorted by {self.duration_col}")
         input = tt.tuplefy(input)
@@ -94,9 +152,12 @@ class CoxTime(models.cox_cc._CoxCCBase):
                  [self.duration_col]
                  .loc[lambda x: x <= max_duration]
                  .drop_duplicates(keep='first'))
-        at_risk_sum = (pd.Series([compute_expg_at_risk(ix, t) for ix, t in times.iteritems()],
-                                 index=times.values)
-                       .rename('at_risk_sum'))
+        sums, se = self._at_risk_sums(input, times.index.values, times.values, batch_size, eval_, num_workers,
+                                      at_risk_sample, chunk_size, verbose)
+        at_risk_sum = pd.Series(sums, index=times.values).rename('at_risk_sum')
+        self.at_risk_rel_se_ = pd.Series(se / sums, index=times.values).rename('at_risk_rel_se')
+        if verbose and at_risk_sample is not None:
+            print('max estimated relative standard error of the at-risk sums:', self.at_risk_rel_se_.max())
         events = (df
                   .groupby(self.duration_col)
                   [[self.event_col]]
@@ -133,12 +194,6 @@ class CoxTime(models.cox_cc._CoxCCBase):
         return pd.DataFrame(hazards, index=baseline_hazards_.index).cumsum()
 
     def partial_log_likelihood(self, input, target, batch_size=8224, eval_=True, num_workers=0):
-        def expg_sum(t, i):
-            sub = input_sorted.iloc[i:]
-            n = sub.lens().flatten().get_if_all_equal()
-            t = np.repeat(t, n).reshape(-1, 1).astype('float32')
-            return np.exp(self.predict((sub, t), batch_size, True, eval_, num_workers=num_workers)).flatten().sum()
-
         durations, events = target
         df = pd.DataFrame({self.duration_col: durations, self.event_col: events})
         df = df.sort_values(self.duration_col)
@@ -149,7 +204,8 @@ class CoxTime(models.cox_cc._CoxCCBase):
                   .assign(_idx=np.arange(len(df)))
                   .loc[lambda x: x[self.event_col] == True]
                   .drop_duplicates(self.duration_col, keep='first')
-                  .assign(_expg_sum=lambda x: [expg_sum(t, i) for t, i in zip(x[self.duration_col], x['_idx'])])
+                  .assign(_expg_sum=lambda x: self._at_risk_sums(input_sorted, x['_idx'].values, x[self.duration_col].values,
+                                                                 batch_size, eval_, num_workers)[0])
                   .drop([self.event_col, '_idx'], axis=1))
         
         idx_name_old = df.index.name
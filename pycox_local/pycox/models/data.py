@@ -21,6 +21,24 @@ def sample_alive_from_dates(dates, at_risk_dict, n_control=1):
         samp[it, :] = at_risk_dict[time][idx[:, it]]
     return samp
 
+def sample_alive_from_start(start, n, n_control=1):
+    """Sample index from living at the times with first at-risk index `start`, for durations
+    sorted in increasing order (where the at-risk set is the range [start, n)).
+    Gives the same samples as `sample_alive_from_dates` with `make_at_risk_dict`, without the dict.
+
+    Arguments:
+        start {np.array} -- First at-risk index of each time, e.g. from `np.searchsorted(durations, dates)`.
+        n {int} -- Number of individuals.
+
+    Keyword Arguments:
+        n_control {int} -- Number of samples. (default: {1})
+
+    Returns:
+        np.array -- [len(start), n_control] array of indices.
+    """
+    idx = (np.random.uniform(size=(n_control, len(start))) * (n - start)).astype('int')
+    return (start + idx).transpose()
+
 def make_at_risk_dict(durations):
     """Create dict(duration: indices) from sorted df.
     A dict mapping durations to indices.
@@ -56,23 +74,29 @@ class DurationSortedDataset(tt.data.DatasetTuple):
 
 
 class CoxCCDataset(torch.utils.data.Dataset):
+    """Case-control dataset. `durations` need to be sorted in increasing order, so the at-risk set
+    of a case is the index range [first index of its duration, n), and controls are drawn by
+    offsetting into that range. The input is kept as tensors, so batches are gathered directly.
+    """
     def __init__(self, input, durations, events, n_control=1):
         df_train_target = pd.DataFrame(dict(duration=durations, event=events))
         self.durations = df_train_target.loc[lambda x: x['event'] == 1]['duration']
-        self.at_risk_dict = make_at_risk_dict(durations)
+        assert pd.Series(durations).is_monotonic_increasing, 'Requires durations to be monotonic'
+        self.n = len(durations)
+        self.case_idx = self.durations.index.values
+        self.at_risk_start = np.searchsorted(np.asarray(durations), self.durations.values, side='left')
 
-        self.input = tt.tuplefy(input)
+        self.input = tt.tuplefy(input).to_tensor()
         assert type(self.durations) is pd.Series
         self.n_control = n_control
 
     def __getitem__(self, index):
         if (not hasattr(index, '__iter__')) and (type(index) is not slice):
             index = [index]
-        fails = self.durations.iloc[index]
-        x_case = self.input.iloc[fails.index]
-        control_idx = sample_alive_from_dates(fails.values, self.at_risk_dict, self.n_control)
+        x_case = self.input.iloc[self.case_idx[index]]
+        control_idx = sample_alive_from_start(self.at_risk_start[index], self.n, self.n_control)
         x_control = tt.TupleTree(self.input.iloc[idx] for idx in control_idx.transpose())
-        return tt.tuplefy(x_case, x_control).to_tensor()
+        return tt.tuplefy(x_case, x_control)
 
     def __len__(self):
         return len(self.durations)
@@ -92,7 +116,7 @@ class CoxTimeDataset(CoxCCDataset):
         control = control.apply_nrec(lambda x: x + durations)
         return tt.tuplefy(case, control)
 
-@numba.njit
+@numba.njit(cache=True)
 def _pair_rank_mat(mat, idx_durations, events, dtype='float32'):
     n = len(idx_durations)
     for i in range(n):
@@ -20,6 +20,9 @@ class DeepHitSingle(models.pmf.PMFBase):
         alpha {float} -- Weighting (0, 1) likelihood and rank loss (L2 in paper).
             1 gives only likelihood, and 0 gives only rank loss. (default: {0.2})
         sigma {float} -- from eta in rank loss (L2 in paper) (default: {0.1})
+        rank_block_size {int} -- If not None, compute the rank loss blockwise from the sorted durations
+            (see `loss.rank_loss_deephit_single_blockwise`), so the dataloader does not build the
+            n x n rank matrix of each batch. Allows much larger batches. (default: {None})
     
     References:
     [1] Changhee Lee, William R Zame, Jinsung Yoon, and Mihaela van der Schaar. Deephit: A deep learning
@@ -36,12 +39,19 @@ class DeepHitSingle(models.pmf.PMFBase):
         with Neural Networks. arXiv preprint arXiv:1910.06724, 2019.
         https://arxiv.org/pdf/1910.06724.pdf
     """
-    def __init__(self, net, optimizer=None, device=None, duration_index=None, alpha=0.2, sigma=0.1, loss=None):
+    def __init__(self, net, optimizer=None, device=None, duration_index=None, alpha=0.2, sigma=0.1, loss=None,
+                 rank_block_size=None):
+        self.rank_block_size = rank_block_size
         if loss is None:
-            loss = models.loss.DeepHitSingleLoss(alpha, sigma)
+            if rank_block_size is None:
+                loss = models.loss.DeepHitSingleLoss(alpha, sigma)
+            else:
+                loss = models.loss.DeepHitSingleLoss(alpha, sigma, block_size=rank_block_size)
         super().__init__(net, loss, optimizer, device, duration_index)
 
     def make_dataloader(self, data, batch_size, shuffle, num_workers=0):
+        if self.rank_block_size is not None:
+            return super().make_dataloader(data, batch_size, shuffle, num_workers)
         dataloader = super().make_dataloader(data, batch_size, shuffle, num_workers,
                                              make_dataset=models.data.DeepHitDataset)
         return dataloader
@@ -1,5 +1,6 @@
 from typing import Tuple
 import torch
+import torch.utils.checkpoint
 from torch import Tensor
 import torch.nn.functional as F
 from pycox_local.pycox.models import utils
@@ -249,6 +250,67 @@ def rank_loss_deephit_single(phi: Tensor, idx_durations: Tensor, events: Tensor,
     rank_loss = _rank_loss_deephit(pmf, y, rank_mat, sigma, reduction)
     return rank_loss
 
+def _rank_loss_deephit_block(cdf: Tensor, rows: Tensor, idx_rows: Tensor, start: Tensor, s0: int,
+                             sigma: float) -> Tensor:
+    """Rank loss of the (duration sorted) event rows `rows` against the columns s0, s0+1, ..., n-1,
+    i.e., sum_j 1{j >= start_i} exp(-(F_i(T_i) - F_j(T_i)) / sigma).
+    """
+    f_at = cdf[s0:].index_select(1, idx_rows).t()
+    f_ii = cdf[rows, idx_rows].view(-1, 1)
+    cols = torch.arange(s0, cdf.shape[0], device=cdf.device).view(1, -1)
+    mask = cols >= start.view(-1, 1)
+    neg_r = torch.where(mask, (f_at - f_ii) / sigma, torch.full_like(f_at, -float('inf')))
+    return neg_r.exp().sum(1)
+
+def rank_loss_deephit_single_blockwise(phi: Tensor, idx_durations: Tensor, events: Tensor, sigma: float,
+                                       reduction: str = 'mean', block_size: int = 1024) -> Tensor:
+    """Same as `rank_loss_deephit_single` but without the n x n `rank_mat` (see `pair_rank_mat`).
+
+    Individuals are sorted by duration, with events before censorings at ties. The individuals
+    j with rank_mat_ij = 1 for an event i are then all positions from the first one after the
+    events tied with i, so the pairs are found from the sorted durations and events directly.
+    The event rows are handled in blocks of `block_size`, and each block is recomputed in the
+    backward pass, so memory is O(block_size * n) instead of O(n^2).
+
+    Arguments:
+        phi {torch.tensor} -- Predictions as float tensor with shape [batch, n_durations]
+            all in (-inf, inf).
+        idx_durations {torch.tensor} -- Int tensor with index of durations.
+        events {torch.tensor} -- Float indicator of event or censoring (1 is event).
+        sigma {float} -- Sigma from DeepHit paper, chosen by you.
+
+    Keyword Arguments:
+        reduction {string} -- How to reduce the loss.
+            'none': No reduction.
+            'mean': Mean of tensor.
+            'sum': sum.
+        block_size {int} -- Number of event rows computed at a time. (default: {1024})
+
+    Returns:
+        torch.tensor -- Rank loss.
+    """
+    idx_durations = idx_durations.view(-1).long()
+    events = events.view(-1).float()
+    n = phi.shape[0]
+    cdf = utils.pad_col(phi).softmax(1).cumsum(1)
+    key = 2 * idx_durations + (events != 1).long()
+    key, order = key.sort()
+    cdf = cdf[order]
+    idx_sorted = idx_durations[order]
+    start = torch.searchsorted(key, 2 * idx_sorted, right=True)
+    event_pos = (events[order] == 1).nonzero().view(-1)
+    loss = torch.zeros(n, device=phi.device, dtype=cdf.dtype)
+    for lo in range(0, len(event_pos), block_size):
+        rows = event_pos[lo:lo+block_size]
+        s0 = int(start[rows].min())
+        args = (cdf, rows, idx_sorted[rows], start[rows], s0, sigma)
+        if cdf.requires_grad:
+            block = torch.utils.checkpoint.checkpoint(_rank_loss_deephit_block, *args, use_reentrant=False)
+        else:
+            block = _rank_loss_deephit_block(*args)
+        loss = loss.index_put((order[rows],), block / n)
+    return _reduction(loss.view(-1, 1), reduction)
+
 def nll_pmf_cr(phi: Tensor, idx_durations: Tensor, events: Tensor, reduction: str = 'mean',
                epsilon: float = 1e-7) -> Tensor:
     """Negative log-likelihood for PMF parameterizations. `phi` is the ''logit''.
@@ -576,6 +638,8 @@ class DeepHitSingleLoss(_DeepHitLoss):
             'none': No reduction.
             'mean': Mean of tensor.
             'sum': sum.
+        block_size {int} -- Block size of `rank_loss_deephit_single_blockwise`, used when no
+            `rank_mat` is passed to forward. (default: {1024})
 
     References:
     [1] Changhee Lee, William R Zame, Jinsung Yoon, and Mihaela van der Schaar. Deephit: A deep learning
@@ -583,10 +647,18 @@ class DeepHitSingleLoss(_DeepHitLoss):
         Intelligence, 2018.
         http://medianetlab.ee.ucla.edu/papers/AAAI_2018_DeepHit
     """
-    def forward(self, phi: Tensor, idx_durations: Tensor, events: Tensor, rank_mat: Tensor) -> Tensor:
+    def __init__(self, alpha: float, sigma: float, reduction: str = 'mean', block_size: int = 1024) -> None:
+        super().__init__(alpha, sigma, reduction)
+        self.block_size = block_size
+
+    def forward(self, phi: Tensor, idx_durations: Tensor, events: Tensor, rank_mat: Tensor = None) -> Tensor:
         nll = nll_pmf(phi, idx_durations, events, self.reduction)
-        rank_loss = rank_loss_deephit_single(phi, idx_durations, events, rank_mat, self.sigma,
-                                             self.reduction)
+        if rank_mat is None:
+            rank_loss = rank_loss_deephit_single_blockwise(phi, idx_durations, events, self.sigma,
+                                                           self.reduction, self.block_size)
+        else:
+            rank_loss = rank_loss_deephit_single(phi, idx_durations, events, rank_mat, self.sigma,
+                                                 self.reduction)
         return self.alpha * nll + (1. - self.alpha) * rank_loss
 
 
@@ -28,7 +28,7 @@ def idx_at_times(index_surv, times, steps='pre', assert_sorted=True):
         idx = np.searchsorted(index_surv, times, side='right') - 1
     return idx.clip(0, len(index_surv)-1)
 
-@numba.njit
+@numba.njit(cache=True)
 def _group_loop(n, surv_idx, durations, events, di, ni):
     idx = 0
     for i in range(n):
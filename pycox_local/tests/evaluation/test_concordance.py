@@ -0,0 +1,39 @@
+import pytest
+import numpy as np
+import pandas as pd
+from pycox.evaluation import EvalSurv
+from pycox.evaluation.concordance import concordance_td
+
+
+def _random_surv(n, m, seed):
+    np.random.seed(seed)
+    durations = np.random.uniform(0, 30, n).round()
+    events = np.random.binomial(1, 0.6, n).astype('float')
+    index_surv = np.linspace(0, 30, m)
+    surv = np.sort(np.random.uniform(0, 1, (m, n)).round(1), axis=0)[::-1]
+    surv = pd.DataFrame(np.ascontiguousarray(surv), index_surv)
+    return surv, durations, events
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+@pytest.mark.parametrize('method', ['adj_antolini', 'antolini'])
+def test_concordance_td_sorted_equals_pairwise(seed, method):
+    surv, durations, events = _random_surv(150, 20, seed)
+    ev = EvalSurv(surv, durations, events)
+    pairwise = ev.concordance_td(method, engine='pairwise')
+    sorted_ = ev.concordance_td(method, engine='sorted')
+    assert np.isclose(pairwise, sorted_)
+
+def test_concordance_td_sorted_all_tied():
+    durations = np.ones(6) * 5.
+    events = np.array([1., 0., 1., 1., 0., 0.])
+    surv = np.array([[0.2, 0.2, 0.4, 0.2, 0.6, 0.1]])
+    surv_idx = np.zeros(6, dtype='int64')
+    for method in ['adj_antolini', 'antolini']:
+        pairwise = concordance_td(durations, events, surv, surv_idx, method)
+        sorted_ = concordance_td(durations, events, surv, surv_idx, method, engine='sorted')
+        assert np.isclose(pairwise, sorted_)
+
+def test_concordance_td_bad_engine():
+    surv, durations, events = _random_surv(10, 5, 0)
+    with pytest.raises(ValueError):
+        EvalSurv(surv, durations, events).concordance_td(engine='fenwick')
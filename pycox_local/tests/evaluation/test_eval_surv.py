@@ -0,0 +1,41 @@
+import pytest
+import numpy as np
+import pandas as pd
+from pycox import utils
+from pycox.evaluation import EvalSurv
+
+
+def _random_surv(n, m, seed):
+    np.random.seed(seed)
+    durations = np.random.uniform(0, 100, n).round()
+    events = np.random.binomial(1, 0.6, n).astype('float')
+    index_surv = np.linspace(0, 100, m)
+    surv = np.sort(np.random.uniform(0, 1, (m, n)), axis=0)[::-1]
+    surv = pd.DataFrame(np.ascontiguousarray(surv), index_surv)
+    return surv, durations, events
+
+def _dense_km_censor(durations, events):
+    km = utils.kaplan_meier(durations, 1 - events)
+    return pd.DataFrame(np.repeat(km.values.reshape(-1, 1), len(durations), axis=1), index=km.index)
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_km_censor_shared_equals_dense(seed):
+    surv, durations, events = _random_surv(60, 30, seed)
+    time_grid = np.linspace(0, 100, 20)
+    ev = EvalSurv(surv, durations, events, censor_surv='km')
+    ev_dense = EvalSurv(surv, durations, events, censor_surv=_dense_km_censor(durations, events))
+    assert ev.censor_surv.surv.shape[1] == 1
+    np.testing.assert_allclose(ev.brier_score(time_grid).values, ev_dense.brier_score(time_grid).values)
+    np.testing.assert_allclose(ev.nbll(time_grid).values, ev_dense.nbll(time_grid).values)
+    assert np.isclose(ev.integrated_brier_score(time_grid), ev_dense.integrated_brier_score(time_grid))
+    assert np.isclose(ev.integrated_nbll(time_grid), ev_dense.integrated_nbll(time_grid))
+
+def test_km_censor_shared_getitem():
+    surv, durations, events = _random_surv(40, 25, 0)
+    time_grid = np.linspace(0, 100, 10)
+    index = [0, 3, 5, 17, 30]
+    ev = EvalSurv(surv, durations, events, censor_surv='km')[index]
+    ev_dense = EvalSurv(surv, durations, events, censor_surv=_dense_km_censor(durations, events))[index]
+    assert ev.censor_surv.surv.shape[1] == 1
+    assert (ev.censor_surv.durations == durations[index]).all()
+    np.testing.assert_allclose(ev.brier_score(time_grid).values, ev_dense.brier_score(time_grid).values)
@@ -0,0 +1,35 @@
+import pytest
+import numpy as np
+from pycox import utils
+from pycox.evaluation import ipcw, admin
+
+
+def _random_data(n, m, seed):
+    np.random.seed(seed)
+    durations = np.random.uniform(0, 100, n).round()
+    events = np.random.binomial(1, 0.6, n).astype('float')
+    index_surv = np.linspace(0, 100, m)
+    surv = np.ascontiguousarray(np.sort(np.random.uniform(0, 1, (m, n)), axis=0)[::-1])
+    return durations, events, index_surv, surv
+
+@pytest.mark.parametrize('metric', [ipcw.brier_score, ipcw.binomial_log_likelihood])
+@pytest.mark.parametrize('shared', [True, False])
+def test_ipcw_reduced_equals_sum_of_scores(metric, shared):
+    durations, events, index_surv, surv = _random_data(70, 25, 0)
+    time_grid = np.linspace(0, 100, 12)
+    km = utils.kaplan_meier(durations, 1 - events)
+    censor_surv = km.values if shared else np.repeat(km.values.reshape(-1, 1), len(durations), axis=1)
+    reduced = metric(time_grid, durations, events, surv, censor_surv, index_surv, km.index.values)
+    scores, weights = metric(time_grid, durations, events, surv, censor_surv, index_surv, km.index.values,
+                             reduce=False)
+    np.testing.assert_allclose(reduced, scores.sum(1) / weights.sum(1))
+
+@pytest.mark.parametrize('metric', [admin.brier_score, admin.binomial_log_likelihood])
+def test_admin_reduced_equals_sum_of_scores(metric):
+    durations, events, index_surv, surv = _random_data(70, 25, 1)
+    durations_c = durations.copy()
+    durations_c[events == 1] += np.random.uniform(0, 20, int(events.sum())).round()
+    time_grid = np.linspace(0, 100, 12)
+    reduced = metric(time_grid, durations, durations_c, events, surv, index_surv)
+    scores, norm = metric(time_grid, durations, durations_c, events, surv, index_surv, reduce=False)
+    np.testing.assert_allclose(reduced, scores.sum(1) / norm.ravel())
@@ -0,0 +1,66 @@
+import pytest
+import numpy as np
+import pandas as pd
+from pycox.evaluation import EvalSurv, StreamingEvalSurv, EvalContext
+from pycox.evaluation import ipcw
+from pycox import utils
+
+
+def _random_surv(n, m, seed):
+    np.random.seed(seed)
+    durations = np.random.uniform(0, 30, n).round()
+    events = np.random.binomial(1, 0.6, n).astype('float')
+    index_surv = np.linspace(0, 30, m)
+    surv = np.sort(np.random.uniform(0, 1, (m, n)).round(1), axis=0)[::-1]
+    return np.ascontiguousarray(surv), index_surv, durations, events
+
+@pytest.mark.parametrize('seed', [0, 1])
+@pytest.mark.parametrize('n_batches', [1, 7, 40])
+@pytest.mark.parametrize('method', ['adj_antolini', 'antolini'])
+def test_streaming_equals_eval_surv(seed, n_batches, method):
+    surv, index_surv, durations, events = _random_surv(120, 20, seed)
+    time_grid = np.linspace(0, 30, 15)
+    ev = EvalSurv(pd.DataFrame(surv, index_surv), durations, events, censor_surv='km')
+    stream = StreamingEvalSurv(EvalContext(durations, events, index_surv, time_grid), method=method)
+    for idx in np.array_split(stream.order, n_batches):
+        stream.update(surv[:, idx], idx)
+    assert np.isclose(stream.concordance_td(), ev.concordance_td(method))
+    np.testing.assert_allclose(stream.brier_score().values, ev.brier_score(time_grid).values)
+    np.testing.assert_allclose(stream.nbll().values, ev.nbll(time_grid).values)
+    assert np.isclose(stream.integrated_brier_score(), ev.integrated_brier_score(time_grid))
+    assert np.isclose(stream.integrated_nbll(), ev.integrated_nbll(time_grid))
+
+def test_streaming_needs_sorted_batches():
+    surv, index_surv, durations, events = _random_surv(30, 10, 0)
+    stream = StreamingEvalSurv(EvalContext(durations, events, index_surv, index_surv))
+    idx = stream.order[::-1]
+    with pytest.raises(ValueError):
+        stream.update(surv[:, idx], idx)
+
+def test_streaming_needs_all_individuals():
+    surv, index_surv, durations, events = _random_surv(30, 10, 0)
+    stream = StreamingEvalSurv(EvalContext(durations, events, index_surv, index_surv))
+    idx = stream.order[:10]
+    stream.update(surv[:, idx], idx)
+    with pytest.raises(RuntimeError):
+        stream.concordance_td()
+
+def test_context_weight_sum_equals_ipcw():
+    surv, index_surv, durations, events = _random_surv(80, 20, 3)
+    time_grid = np.linspace(0, 30, 15)
+    context = EvalContext(durations, events, index_surv, time_grid)
+    km = utils.kaplan_meier(durations, 1-events)
+    _, weights = ipcw.brier_score(time_grid, durations, events, surv, km.values, index_surv,
+                                  km.index.values, np.inf, False)
+    np.testing.assert_allclose(context.weight_sum, weights.sum(1))
+
+def test_context_shared_by_checkpoints():
+    surv, index_surv, durations, events = _random_surv(60, 20, 4)
+    time_grid = np.linspace(0, 30, 15)
+    context = EvalContext(durations, events, index_surv, time_grid)
+    for surv_k in [surv, surv**2]:
+        stream = StreamingEvalSurv(context)
+        stream.update(surv_k[:, stream.order], stream.order)
+        ev = EvalSurv(pd.DataFrame(surv_k, index_surv), durations, events, censor_surv='km')
+        assert np.isclose(stream.concordance_td(), ev.concordance_td())
+        assert np.isclose(stream.integrated_brier_score(), ev.integrated_brier_score(time_grid))
@@ -1,4 +1,5 @@
 import pytest
+import numpy as np
 import torchtuples as tt
 from pycox.models import CoxTime
 from pycox.models.cox_time import MLPVanillaCoxTime
@@ -19,3 +20,23 @@ def test_cox_time_runs(numpy):
     fit_model(data, model)
     model.compute_baseline_hazards()
     assert_survs(data[0], model, with_dl=False)
+
+
+def test_cox_time_at_risk_sums_match_loop():
+    input, target = make_dataset(False).apply(lambda x: x.float()).to_numpy()
+    labtrans = CoxTime.label_transform()
+    target = labtrans.fit_transform(*target)
+    net = MLPVanillaCoxTime(input.shape[1], [4], False)
+    model = CoxTime(net)
+    order = np.argsort(target[0], kind='stable')
+    input = tt.tuplefy(input).iloc[order]
+    times = target[0][order][::50]
+    start = np.arange(len(order))[::50]
+    expected = [np.exp(model.predict((input.iloc[i:], np.repeat(t, len(order) - i).reshape(-1, 1)))).sum()
+                for i, t in zip(start, times)]
+    sums, se = model._at_risk_sums(input, start, times, batch_size=64, chunk_size=100)
+    assert np.allclose(sums, expected, rtol=1e-4)
+    assert (se == 0).all()
+    sums, se = model._at_risk_sums(input, start, times, batch_size=64, at_risk_sample=50)
+    assert (se[start < len(order) - 50] > 0).all()
+    assert (np.abs(sums - expected) <= 6 * se + 1e-4 * np.abs(expected)).all()
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+from pycox.models.data import sample_alive_from_dates, sample_alive_from_start, make_at_risk_dict, CoxCCDataset
+
+
+@pytest.mark.parametrize('n_control', [1, 3])
+def test_sample_alive_from_start_matches_dict(n_control):
+    np.random.seed(0)
+    durations = np.sort(np.random.randint(0, 30, 200)).astype('float32')
+    dates = durations[::7]
+    np.random.seed(1)
+    expected = sample_alive_from_dates(dates, make_at_risk_dict(durations), n_control)
+    np.random.seed(1)
+    samp = sample_alive_from_start(np.searchsorted(durations, dates), len(durations), n_control)
+    assert (samp == expected).all()
+
+
+def test_cox_cc_dataset_controls_at_risk():
+    np.random.seed(0)
+    n = 300
+    durations = np.sort(np.random.uniform(0, 10, n)).astype('float32')
+    events = np.random.binomial(1, 0.5, n).astype('float32')
+    input = np.arange(n, dtype='float32').reshape(-1, 1)
+    dataset = CoxCCDataset(input, durations, events, n_control=2)
+    case, control = dataset[np.arange(len(dataset))]
+    case = case[0].numpy().astype('int').flatten()
+    assert (events[case] == 1).all()
+    for x in control:
+        x = x[0].numpy().astype('int').flatten()
+        assert (durations[x] >= durations[case]).all()
@@ -40,6 +40,23 @@ def test_rank_loss_deephit_cr_equals_single(seed, m, sigma):
     assert (r1 - r2).abs() < 1e-6
 
 
+@pytest.mark.parametrize('seed', [0, 1, 2])
+@pytest.mark.parametrize('block_size', [1, 7, 1024])
+@pytest.mark.parametrize('sigma', [0.1, 1.])
+def test_rank_loss_deephit_blockwise_equals_rank_mat(seed, block_size, sigma):
+    torch.manual_seed(seed)
+    batch, m = 60, 6
+    phi = torch.randn(batch, m, requires_grad=True)
+    idx_duration = torch.randint(0, m, (batch,))
+    events = torch.randint(0, 2, (batch,)).float()
+    rank_mat = torch.tensor(pair_rank_mat(idx_duration.numpy(), events.numpy()))
+    r1 = loss.rank_loss_deephit_single(phi, idx_duration, events, rank_mat, sigma, 'none')
+    r2 = loss.rank_loss_deephit_single_blockwise(phi, idx_duration, events, sigma, 'none', block_size)
+    assert (r1 - r2).abs().max() < 1e-5
+    g1, = torch.autograd.grad(r1.mean(), phi)
+    g2, = torch.autograd.grad(r2.mean(), phi)
+    assert (g1 - g2).abs().max() < 1e-5
+
 @pytest.mark.parametrize('seed', [0, 1])
 @pytest.mark.parametrize('m', [1, 8])
 @pytest.mark.parametrize('sigma', [0.1, 1.])
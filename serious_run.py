@@ -1,4 +1,3 @@
-import pycox_local.pycox.datasets
 from sumo_net.hyperopt_class import *
 import torch
 import argparse
@@ -6,11 +5,7 @@ import warnings
 warnings.simplefilter("ignore")
 from generate_job_parameters import load_obj
 
-pycox_local.pycox.datasets.support.read_df()
-#pycox_local.pycox.datasets.flchain.read_df()
-pycox_local.pycox.datasets.metabric.read_df()
-pycox_local.pycox.datasets.gbsg.read_df()
-# pycox_local.pycox.datasets.kkbox.read_df()
+#Datasets are read by get_dataloader when a job needs them, nothing is loaded at import time
 def job_parser():
     parser = argparse.ArgumentParser()
     parser.add_argument('--job_path', type=str, nargs='?', default='', help='which dataset to run')
@@ -116,10 +111,18 @@ if __name__ == '__main__':
         'objective': loss_type[args['loss_type']],
         'fold_idx': args['fold_idx'],
         'savedir':args['savedir'],
-        'use_sotle': False
-
+        'use_sotle': False,
+        'prefetch_workers': args.get('prefetch_workers',0),
+        'parallel_trials': args.get('parallel_trials',0),
+        'dataset_cache_dir': args.get('dataset_cache_dir',None), #opt in, e.g. 'dataset_cache'
+        'asha_eta': args.get('asha_eta',0),
+        'asha_min_cycles': args.get('asha_min_cycles',args['validation_interval']),
     }
     print(job_params)
     training_obj = hyperopt_training(job_param=job_params,hyper_param_space=hyper_param_space)
-    training_obj.run()
+    if job_params['parallel_trials']>0:
+        threads = max(1,os.cpu_count()//job_params['parallel_trials'])
+        training_obj.run_parallel(job_params['parallel_trials'],threads_per_worker=threads)
+    else:
+        training_obj.run()
     #training_obj.post_process()
\ No newline at end of file
@@ -0,0 +1,33 @@
+import threading
+import numpy as np
+
+class asha_scheduler():
+    #Asynchronous successive halving on the validation criteria hyperopt_training computes every cycle_length steps.
+    #Rung k sits at min_cycles*eta**k validation cycles. A trial reaching a rung records its best criteria so far and is
+    #stopped if it is outside the best 1/eta of everything recorded at that rung, so bad configurations stop after
+    #min_cycles cycles and only the top fraction keeps training to the next rung. Decisions never wait for other trials,
+    #which keeps every worker of run_parallel busy. A rung only stops trials once eta results are recorded at it.
+    #Lower criteria is better. rungs/lock default to process local objects, run_parallel passes Manager proxies.
+    def __init__(self,eta,min_cycles,max_cycles,rungs=None,lock=None):
+        self.eta = eta
+        self.milestones = []
+        cycles = max(1,min_cycles)
+        while cycles < max_cycles:
+            self.milestones.append(cycles)
+            cycles *= eta
+        self.rungs = {} if rungs is None else rungs
+        self.lock = threading.Lock() if lock is None else lock
+
+    def report(self,tid,cycle,criteria):
+        '''Returns True if trial tid should stop at validation cycle `cycle` (counted from 1) with best criteria so far.'''
+        if cycle not in self.milestones:
+            return False
+        with self.lock:
+            recorded = self.rungs.get(cycle,[]) + [criteria]
+            self.rungs[cycle] = recorded
+        if len(recorded) < self.eta:
+            return False
+        stop = criteria > np.quantile(recorded,1/self.eta)
+        if stop:
+            print(f'ASHA: stopping trial {tid} at rung {self.milestones.index(cycle)} ({cycle} validation cycles)')
+        return stop
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import torch
+from nets.ensemble import survival_net_ensemble
+
+class ensemble_training():
+    #Trains the K members of a survival_net_ensemble together on one survival_dataset. Every member draws its own
+    #epoch permutation from a generator seeded with its seed, so member k sees the same batches a single model run
+    #with that seed would shuffle into, and each step gathers a (K,bs,...) batch for one vmapped forward/backward.
+    def __init__(self,dataset,net_init_params,seeds,bs,lr=1e-2,weight_decay=0.,device='cpu'):
+        self.dataset = dataset
+        self.seeds = list(seeds)
+        self.bs = bs
+        self.device = device
+        self.model = survival_net_ensemble(net_init_params,self.seeds).to(device)
+        self.optimizer = torch.optim.Adam(self.model.parameters(),lr=lr,weight_decay=weight_decay)
+        self.generators = [torch.Generator().manual_seed(seed) for seed in self.seeds]
+
+    def member_batches(self):
+        self.dataset.set(mode='train')
+        n = self.dataset.X.shape[0]
+        perms = torch.stack([torch.randperm(n,generator=g) for g in self.generators])
+        valid_cat = not isinstance(self.dataset.cat_X,list)
+        for start in range(0,n,self.bs):
+            idx = perms[:,start:start+self.bs]
+            x_cat = self.dataset.cat_X[idx].to(self.device) if valid_cat else []
+            yield self.dataset.X[idx].to(self.device),self.dataset.y[idx].to(self.device),self.dataset.delta[idx].to(self.device),x_cat
+
+    def train_epoch(self):
+        '''One epoch for every member, returns the mean training loss per member (K,).'''
+        self.model.train()
+        total = torch.zeros(len(self.seeds),device=self.device)
+        steps = 0
+        for X,y,delta,x_cat in self.member_batches():
+            losses = self.model.loss(X,y,delta,x_cat)
+            self.optimizer.zero_grad()
+            losses.sum().backward()
+            self.optimizer.step()
+            total += losses.detach()
+            steps += 1
+        return total/steps
+
+    def fit(self,epochs):
+        for epoch in range(epochs):
+            losses = self.train_epoch()
+            print(f'epoch {epoch} member losses: {losses.cpu().numpy()}')
+        return losses
+
+    def predict_surv_df(self,mode='test',grid_size=100,members=False):
+        '''Ensemble mean survival curves of a split as a DataFrame indexed by time, the layout EvalSurv expects.
+        With members=True a list with one DataFrame per member is returned instead.'''
+        self.model.eval()
+        self.dataset.set(mode=mode)
+        t_grid_np = np.linspace(self.dataset.min_duration,self.dataset.max_duration,grid_size)
+        time_grid = torch.from_numpy(t_grid_np).float().unsqueeze(-1).to(self.device)
+        valid_cat = not isinstance(self.dataset.cat_X,list)
+        S = []
+        with torch.no_grad():
+            for start in range(0,self.dataset.X.shape[0],self.bs):
+                X = self.dataset.X[start:start+self.bs].to(self.device)
+                x_cat = self.dataset.cat_X[start:start+self.bs].to(self.device) if valid_cat else []
+                S.append(self.model.member_S_eval_grid(X,time_grid,x_cat).cpu())
+        S = torch.cat(S,-1)
+        index = self.dataset.invert_duration(t_grid_np.reshape(-1,1)).squeeze()
+        if members:
+            return [pd.DataFrame(S_k.numpy(),index=index) for S_k in S]
+        return pd.DataFrame(S.mean(0).numpy(),index=index)
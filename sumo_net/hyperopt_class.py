@@ -1,21 +1,19 @@
-from hyperopt import hp,tpe,Trials,fmin,space_eval,STATUS_OK,STATUS_FAIL,rand
 from nets.nets import *
 from utils.dataloaders import get_dataloader
 import torch
 import os
 import pickle
 import numpy as np
-from utils.dataloaders import custom_dataloader
-from pycox_local.pycox.evaluation import EvalSurv
+from utils.dataloaders import custom_dataloader,prefetch_dataloader
+from utils.checkpoints import checkpoint_manager
+from sumo_net.asha import asha_scheduler
+from pycox_local.pycox.evaluation import EvalSurv,StreamingEvalSurv,EvalContext
 import pandas as pd
 import shutil
-from torch.utils.tensorboard import SummaryWriter
 from tqdm import tqdm
-from pycox_local.pycox.models import *
-from pycox_local.pycox.models.cox_time import MLPVanillaCoxTime,MixedInputMLPCoxTime
-import torchtuples as tt
 import time
-from utils.deephit_transformation_fix import *
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor,wait,FIRST_COMPLETED
 
 
 def square(x):
@@ -59,8 +57,24 @@ class fifo_list():
     def get_sum(self):
         return sum(self.fifo_list)
 
+_worker_training = None
+
+def _init_worker(job_param,hyper_param_space,threads,asha=None):
+    #Runs once per pool process: limit torch threads and build the training object, so the dataset is loaded once per worker
+    global _worker_training
+    torch.set_num_threads(threads)
+    _worker_training = hyperopt_training(job_param,hyper_param_space)
+    if asha is not None: #shares the rungs with the other workers
+        _worker_training.asha = asha
+
+def _run_trial(tid,params):
+    #The trial id pins the dump_model/load_model path, so workers never overwrite each other's checkpoints
+    _worker_training.global_hyperit = tid
+    return _worker_training(params)
+
 class hyperopt_training():
     def __init__(self,job_param,hyper_param_space,custom_dataloader=None):
+        self.job_param = job_param
         self.d_out = job_param['d_out']
         self.dataset_string = job_param['dataset_string']
         self.seed = job_param['seed']
@@ -77,13 +91,20 @@ class hyperopt_training():
         self.fold_idx = job_param['fold_idx']
         self.savedir = job_param['savedir']
         self.chunks = 50 #job_param['chunks']
-        self.max_series_accumulation = 50000 # job_param['max_series_accumulation']
         self.validate_train = False #job_param['validate_train']
+        self.prefetch_workers = job_param.get('prefetch_workers',0)
+        self.deephit_rank_block_size = job_param.get('deephit_rank_block_size',1024)
+        self.asha_eta = job_param.get('asha_eta',0)
+        self.asha_min_cycles = job_param.get('asha_min_cycles',self.validation_interval)
+        self.asha = self.make_asha() if self.asha_eta>1 else None
         self.global_hyperit = 0
         self.best = np.inf
         self.debug = False
         #torch.cuda.set_device(self.device)
         self.custom_dataloader = custom_dataloader
+        self.dataloader_cache = {}
+        self.eval_contexts = {}
+        self.checkpoints = checkpoint_manager()
         self.save_path = f'{self.savedir}/{self.dataset_string}_seed={self.seed}_fold_idx={self.fold_idx}_objective={self.objective}_{self.net_type}/'
         if not os.path.exists(self.save_path):
             os.makedirs(self.save_path)
@@ -93,10 +114,24 @@ class hyperopt_training():
         self.get_hyperparameterspace(hyper_param_space)
         self.hyper_param_space = hyper_param_space
 
+    def make_asha(self,rungs=None,lock=None):
+        #Fidelity is counted in validation cycles, an epoch has about validation_interval of them
+        return asha_scheduler(self.asha_eta,self.asha_min_cycles,self.total_epochs*self.validation_interval,rungs=rungs,lock=lock)
+
+    def cached_dataloader(self,bs,sumo_net):
+        #The split only depends on the job, not on the trial, so it is loaded once and reused with a new batch size
+        if sumo_net not in self.dataloader_cache:
+            self.dataloader_cache[sumo_net] = get_dataloader(self.dataset_string,bs,self.seed,self.fold_idx,sumo_net=sumo_net,
+                                                             cache_dir=self.job_param.get('dataset_cache_dir'))
+        dataloader = self.dataloader_cache[sumo_net]
+        dataloader.dataset.set(mode='train') #the previous trial left it on the test split, lengths must come from train
+        dataloader.batch_size = bs
+        return dataloader
+
     def calc_eval_objective(self,S,f,S_extended,durations,events,time_grid):
         val_likelihood = self.train_objective(S,f)
         eval_obj = EvalSurv(surv=S_extended,durations=durations,events=events,censor_surv='km') #Add index and pass as DF
-        conc = eval_obj.concordance_td()
+        conc = eval_obj.concordance_td(engine='sorted')
         ibs = eval_obj.integrated_brier_score(time_grid)
         inll = eval_obj.integrated_nbll(time_grid)
         return val_likelihood,conc,ibs,inll
@@ -106,12 +141,13 @@ class hyperopt_training():
         t_grid_np = np.linspace(y.min(), y.max(), surv.index.shape[0])
         surv = surv.set_index(t_grid_np)
         ev = EvalSurv(surv=surv, durations=y, events=events, censor_surv='km')
-        conc = ev.concordance_td()
+        conc = ev.concordance_td(engine='sorted')
         ibs = ev.integrated_brier_score(t_grid_np)
         inll = ev.integrated_nbll(t_grid_np)
         return conc,ibs,inll
 
     def get_hyperparameterspace(self,hyper_param_space):
+        from hyperopt import hp
         self.hyperparameter_space = {}
         for string in self.hyperopt_params:
             self.hyperparameter_space[string] = hp.choice(string, hyper_param_space[string])
@@ -124,12 +160,18 @@ class hyperopt_training():
         print(f"----------------new hyperopt iteration {self.global_hyperit}------------------")
         print(parameters_in)
         sumo_net = self.net_type in ['survival_net_basic','survival_net','weibull_net','lognormal_net']
+        if not sumo_net:
+            #The benchmark backends are only imported by the jobs that train them
+            import torchtuples as tt
+            from pycox_local.pycox.models import CoxPH,CoxCC,CoxTime,DeepHitSingle
+            from pycox_local.pycox.models.cox_time import MLPVanillaCoxTime,MixedInputMLPCoxTime
+            from utils.deephit_transformation_fix import LabTransDiscreteTime
         if self.custom_dataloader is not None:
             self.dataloader=self.custom_dataloader
             self.dataloader.batch_size = parameters_in['bs']
             x_c = self.dataloader.dataset.x_c
         else:
-            self.dataloader = get_dataloader(self.dataset_string,parameters_in['bs'],self.seed,self.fold_idx,sumo_net=sumo_net)
+            self.dataloader = self.cached_dataloader(parameters_in['bs'],sumo_net)
             x_c = self.dataloader.dataset.X.shape[1]
         self.cycle_length = self.dataloader.__len__()//self.validation_interval+1
         print('cycle_length',self.cycle_length)
@@ -278,7 +320,8 @@ class hyperopt_training():
                         (self.dataloader.dataset.train_X.numpy()[bool_fix_train], self.dataloader.dataset.train_cat_X.numpy()[bool_fix_train]))
 
                 self.wrapper = DeepHitSingle(self.model, tt.optim.Adam, alpha=parameters_in['alpha'],
-                                             sigma=parameters_in['sigma'], duration_index=labtrans.cuts)
+                                             sigma=parameters_in['sigma'], duration_index=labtrans.cuts,
+                                             rank_block_size=self.deephit_rank_block_size)
             else:
                 if cat_cols_nr==0:
                     val_data = tt.tuplefy(self.dataloader.dataset.val_X.numpy(), y_val)
@@ -340,6 +383,7 @@ class hyperopt_training():
             self.scheduler = torch.optim.lr_scheduler.ReduceLROnPlateau(self.optimizer, 'min',patience=self.patience//4,min_lr=1e-3,factor=0.9)
             results = self.full_loop()
             del self.optimizer
+        self.checkpoints.flush()
         self.global_hyperit+=1
         results['net_init_params'] = net_init_params
         torch.cuda.empty_cache()
@@ -358,6 +402,7 @@ class hyperopt_training():
             if cat_cols_nr==0:
                 x_test = self.dataloader.dataset.test_X.numpy()
             else:
+                import torchtuples as tt
                 x_test = tt.tuplefy((self.dataloader.dataset.test_X.numpy(), self.dataloader.dataset.test_cat_X.numpy()))
 
             surv = self.wrapper.predict_surv_df(x_test)
@@ -373,7 +418,7 @@ class hyperopt_training():
             chunks = self.dataloader.batch_size // 50 + 1
             t_grid_np = np.linspace(self.dataloader.dataset.min_duration, self.dataloader.dataset.max_duration,
                                     grid_size)
-            time_grid = torch.from_numpy(t_grid_np).float().unsqueeze(-1)
+            time_grid = torch.from_numpy(t_grid_np).float().unsqueeze(-1).to(self.device)
             for i, (X, x_cat, y, delta) in enumerate(tqdm(self.dataloader)):
                 X = X.to(self.device)
                 y = y.to(self.device)
@@ -381,22 +426,7 @@ class hyperopt_training():
                 mask = delta == 1
                 if not isinstance(x_cat, list):
                     x_cat = x_cat.to(self.device)
-                if not isinstance(x_cat, list):
-                    for chk, chk_cat in zip(torch.chunk(X, chunks), torch.chunk(x_cat, chunks)):
-                        input_time = time_grid.repeat((chk.shape[0], 1)).to(self.device)
-                        X_repeat = chk.repeat_interleave(grid_size, 0)
-                        x_cat_repeat = chk_cat.repeat_interleave(grid_size, 0)
-                        S_serie = self.model.forward_S_eval(X_repeat, input_time, x_cat_repeat)  # Fix
-                        S_serie = S_serie.detach()
-                        S_series_container.append(S_serie.view(-1, grid_size).t().cpu())
-                else:
-                    x_cat_repeat = []
-                    for chk in torch.chunk(X, chunks):
-                        input_time = time_grid.repeat((chk.shape[0], 1)).to(self.device)
-                        X_repeat = chk.repeat_interleave(grid_size, 0)
-                        S_serie = self.model.forward_S_eval(X_repeat, input_time, x_cat_repeat)  # Fix
-                        S_serie = S_serie.detach()
-                        S_series_container.append(S_serie.view(-1, grid_size).t().cpu())
+                S_series_container.extend(self.eval_survival_curves(X, x_cat, time_grid, chunks))
                 durations.append(y.cpu().numpy())
                 events.append(delta.cpu().numpy())
             S_series_container = pd.DataFrame(torch.cat(S_series_container, 1).numpy())
@@ -406,6 +436,13 @@ class hyperopt_training():
         timing = end-start
         return timing
 
+    def eval_survival_curves(self,X,x_cat,time_grid,chunks):
+        #Survival curves (grid_size x chunk) per chunk, the covariate net only runs once per individual
+        x_chunks = torch.chunk(X, chunks)
+        cat_chunks = torch.chunk(x_cat, chunks) if not isinstance(x_cat, list) else [[]]*len(x_chunks)
+        with torch.no_grad():
+            return [self.model.forward_S_eval_grid(chk, time_grid, chk_cat).cpu() for chk,chk_cat in zip(x_chunks,cat_chunks)]
+
     def do_metrics(self,training_loss,likelihood,reg_loss,i):
         val_likelihood, conc, ibs, ibll = self.validation_score()
         if self.debug:
@@ -452,29 +489,33 @@ class hyperopt_training():
                 self.counter += 1
             if self.counter>self.patience:
                 return True
+            self.cycle += 1
+            self.trial_best = min(self.trial_best,criteria)
+            if self.asha is not None and self.asha.report(self.global_hyperit,self.cycle,self.trial_best):
+                self.asha_stopped = True
+                return True
 
     def training_loop(self,epoch):
         self.dataloader.dataset.set(mode='train')
+        self.batches_per_epoch = len(self.dataloader)
         total_loss_train=0.
         tot_likelihood=0.
         tot_reg_loss=0.
         self.model = self.model.train()
-        for i,(X,x_cat,y,delta) in enumerate(tqdm(self.dataloader)):
+        if self.prefetch_workers>0:
+            batches = iter(prefetch_dataloader(self.dataloader,self.device,workers=self.prefetch_workers))
+        else:
+            batches = iter(self.dataloader)
+        for i,(X,x_cat,y,delta) in enumerate(tqdm(batches,total=len(batches))):
             X = X.to(self.device)
             y = y.to(self.device)
             delta = delta.to(self.device)
             mask = delta==1
-            X_f = X[mask, :]
-            y_f = y[mask, :]
             if not isinstance(x_cat,list): #F
                 x_cat = x_cat.to(self.device)
-                x_cat_f = x_cat[mask,:]
-            else:
-                x_cat_f = []
-            S = self.model.forward_cum(X, y, mask, x_cat)
+            S,f = self.model.forward_train(X, y, mask, x_cat)
             if S.numel() == 0:
                 S=S.detach()
-            f = self.model(X_f, y_f, x_cat_f)
             if f.numel() == 0:
                 f=f.detach()
             # print(torch.isnan(S).sum())
@@ -486,13 +527,69 @@ class hyperopt_training():
             #     print(par.grad)
 
             self.optimizer.step()
+            self.trained_batches += 1
             total_loss_train+=total_loss.detach()
             tot_likelihood+=total_loss.detach()
             if self.eval_func(i,total_loss_train/(i+1),tot_likelihood/(i+1),tot_reg_loss/(i+1)):
+                batches.close()
                 return True
         return False
 
-    def eval_loop(self,grid_size,chunks=50,max_series_accumulation=50000, is_test=False):
+    def eval_context(self,grid_size,mode):
+        #Censoring weights, grid lookups and the concordance denominator of a split do not change between checkpoints
+        dataset = self.dataloader.dataset
+        key = (id(dataset),mode,grid_size)
+        if key not in self.eval_contexts:
+            t_grid_np = np.linspace(dataset.min_duration, dataset.max_duration, grid_size)
+            t_grid_np = dataset.invert_duration(t_grid_np.reshape(-1, 1)).squeeze()
+            durations = dataset.invert_duration(dataset.y.numpy()).ravel()
+            events = dataset.delta.numpy()
+            self.eval_contexts[key] = EvalContext(durations, events, index_surv=t_grid_np, time_grid=t_grid_np)
+        return self.eval_contexts[key]
+
+    def streaming_eval_loop(self,grid_size,mode,chunks=50):
+        #Same metrics as eval_loop, but the survival curves of each batch are fed to StreamingEvalSurv and dropped,
+        #so the grid_size x n matrix is never built. Batches follow increasing durations as the evaluator requires.
+        self.model.eval()
+        dataset = self.dataloader.dataset
+        S_log = []
+        f_log = []
+        chunks = self.dataloader.batch_size//chunks+1
+        t_grid_np = np.linspace(dataset.min_duration, dataset.max_duration, grid_size)
+        input_time = torch.from_numpy(t_grid_np).float().unsqueeze(-1).to(self.device)
+        evaluator = StreamingEvalSurv(self.eval_context(grid_size,mode))
+        for idx in tqdm(np.array_split(evaluator.order, len(self.dataloader))):
+            if len(idx)==0:
+                continue
+            torch_idx = torch.from_numpy(idx)
+            X = dataset.X[torch_idx].to(self.device)
+            y = dataset.y[torch_idx].to(self.device)
+            delta = dataset.delta[torch_idx].to(self.device)
+            mask = delta == 1
+            x_cat = dataset.cat_X[torch_idx].to(self.device) if not isinstance(dataset.cat_X, list) else []
+            S, f = self.model.forward_train(X, y, mask, x_cat)
+            if S.numel() != 0:
+                S_log.append(S.detach())
+            if f.numel() != 0:
+                f_log.append(f.detach())
+            evaluator.update(torch.cat(self.eval_survival_curves(X, x_cat, input_time, chunks), 1).numpy(), idx)
+        if S_log:
+            S_log = torch.cat(S_log)
+        else:
+            S_log = torch.empty(0, 1, dtype=torch.float32).to(self.device)
+
+        if f_log:
+            f_log = torch.cat(f_log)
+        else:
+            f_log = torch.empty(0, 1, dtype=torch.float32).to(self.device)
+        val_likelihood = self.train_objective(S_log, f_log)
+        conc = evaluator.concordance_td()
+        ibs = evaluator.integrated_brier_score()
+        inll = evaluator.integrated_nbll()
+        self.model.train()
+        return [val_likelihood.item(),val_likelihood.item()],conc,ibs,inll
+
+    def eval_loop(self,grid_size,chunks=50, is_test=False):
         self.model.eval()
         S_series_container = []
         S_log = []
@@ -503,47 +600,22 @@ class hyperopt_training():
         t_grid_np = np.linspace(self.dataloader.dataset.min_duration, self.dataloader.dataset.max_duration,
                                 grid_size)
         time_grid = torch.from_numpy(t_grid_np).float().unsqueeze(-1)
+        input_time = time_grid.to(self.device)
         for i, (X, x_cat, y, delta) in enumerate(tqdm(self.dataloader)):
             X = X.to(self.device)
             y = y.to(self.device)
             delta = delta.to(self.device)
             mask = delta == 1
-            X_f = X[mask, :]
-            y_f = y[mask, :]
             if not isinstance(x_cat, list):
                 x_cat = x_cat.to(self.device)
-                x_cat_f = x_cat[mask, :]
-            else:
-                x_cat_f = []
-            if torch.sum(mask).item() != mask.shape[0]:
-                S = self.model.forward_cum(X, y, mask, x_cat)
-                S = S.detach()
-                S_log.append(S)
-            if torch.sum(mask).item() != 0:
-                X_f = X_f.to(self.device)
-                y_f = y_f.to(self.device)
-                f = self.model(X_f, y_f, x_cat_f)
-                f = f.detach()
-                f_log.append(f)
-            if i*X.shape[0]<max_series_accumulation:
-                if not isinstance(x_cat, list):
-                    for chk,chk_cat in zip(torch.chunk(X, chunks),torch.chunk(x_cat, chunks)):
-                        input_time = time_grid.repeat((chk.shape[0], 1)).to(self.device)
-                        X_repeat = chk.repeat_interleave(grid_size, 0)
-                        x_cat_repeat = chk_cat.repeat_interleave(grid_size, 0)
-                        S_serie = self.model.forward_S_eval(X_repeat, input_time, x_cat_repeat)  # Fix
-                        S_serie = S_serie.detach()
-                        S_series_container.append(S_serie.view(-1, grid_size).t().cpu())
-                else:
-                    x_cat_repeat = []
-                    for chk in torch.chunk(X, chunks):
-                        input_time = time_grid.repeat((chk.shape[0], 1)).to(self.device)
-                        X_repeat = chk.repeat_interleave(grid_size, 0)
-                        S_serie = self.model.forward_S_eval(X_repeat, input_time, x_cat_repeat)  # Fix
-                        S_serie = S_serie.detach()
-                        S_series_container.append(S_serie.view(-1, grid_size).t().cpu())
-                durations.append(y.cpu().numpy())
-                events.append(delta.cpu().numpy())
+            S, f = self.model.forward_train(X, y, mask, x_cat)
+            if S.numel() != 0:
+                S_log.append(S.detach())
+            if f.numel() != 0:
+                f_log.append(f.detach())
+            S_series_container.extend(self.eval_survival_curves(X, x_cat, input_time, chunks))
+            durations.append(y.cpu().numpy())
+            events.append(delta.cpu().numpy())
         non_normalized_durations = np.concatenate(durations)
         durations = self.dataloader.dataset.invert_duration(non_normalized_durations).squeeze()
         events = np.concatenate(events).squeeze()
@@ -723,25 +795,31 @@ class hyperopt_training():
 
     def train_score(self):
         self.dataloader.dataset.set(mode='train')
-        return self.eval_loop(self.grid_size,chunks=self.chunks,max_series_accumulation=self.max_series_accumulation)
+        return self.streaming_eval_loop(self.grid_size,'train',chunks=self.chunks)
     def validation_score(self):
         self.dataloader.dataset.set(mode='val')
-        return self.eval_loop(self.grid_size,chunks=self.chunks,max_series_accumulation=self.max_series_accumulation)
+        return self.streaming_eval_loop(self.grid_size,'val',chunks=self.chunks)
 
     def test_score(self):
         self.dataloader.dataset.set(mode='test')
         return self.eval_loop(self.grid_size, is_test=True)
     def dump_model(self):
-        torch.save(self.model.state_dict(), self.save_path + f'best_model_{self.global_hyperit}.pt')
+        self.checkpoints.save(self.model, self.save_path + f'best_model_{self.global_hyperit}.pt')
 
     def load_model(self):
-        self.model.load_state_dict(torch.load(self.save_path + f'best_model_{self.global_hyperit}.pt'))
+        self.checkpoints.restore(self.model, self.save_path + f'best_model_{self.global_hyperit}.pt')
 
     def full_loop(self):
         self.counter = 0
+        self.best = np.inf #per trial, a worker runs many trials on one object
+        self.cycle = 0
+        self.trial_best = np.inf
+        self.trained_batches = 0
+        self.asha_stopped = False
         from time import time
         tic = time()
         if self.debug:
+            from torch.utils.tensorboard import SummaryWriter
             self.writer =SummaryWriter()
             self.debug_list = []
         for i in range(self.total_epochs):
@@ -753,14 +831,15 @@ class hyperopt_training():
         self.load_model()
         val_likelihood,val_conc,val_ibs,val_inll = self.validation_score()
         test_likelihood,test_conc,test_ibs,test_inll = self.test_score()
-
-
-
-        return self.parse_results(val_likelihood,val_conc,val_ibs,val_inll,
-                                  test_likelihood,test_conc,test_ibs,test_inll)
+        results = self.parse_results(val_likelihood,val_conc,val_ibs,val_inll,
+                                     test_likelihood,test_conc,test_ibs,test_inll)
+        results['epochs'] = self.trained_batches/self.batches_per_epoch
+        results['asha_stopped'] = self.asha_stopped
+        return results
 
     def parse_results(self, val_likelihood,val_conc,val_ibs,val_inll,
                       test_likelihood, test_conc, test_ibs, test_inll,val_loss_cox=None):
+        from hyperopt import STATUS_OK
         if self.selection_criteria == 'train':
             if val_loss_cox is None:
                 criteria = val_likelihood[0]
@@ -800,6 +879,7 @@ class hyperopt_training():
     def run(self):
         if os.path.exists(self.save_path + 'hyperopt_database.p'):
             return
+        from hyperopt import Trials
         trials = Trials()
         from time import time
         tic = time()
@@ -820,6 +900,62 @@ class hyperopt_training():
                          "wb"))
 
 
+    def run_parallel(self,workers,threads_per_worker=1):
+        #Evaluates self.hyperits TPE trials on a pool of `workers` processes. Proposals are drawn one at a time whenever a
+        #worker is free, with the running trials in the Trials store, and results are written back into it as in fmin.
+        #With ASHA (asha_eta>1) the budget is hyperits*total_epochs training epochs instead of hyperits trials, so the
+        #epochs saved by stopping bad trials early go to new proposals. Running trials reserve a full trial's budget.
+        if os.path.exists(self.save_path + 'hyperopt_database.p'):
+            return
+        from hyperopt import tpe,Trials,space_eval,STATUS_FAIL
+        from hyperopt.base import Domain,JOB_STATE_RUNNING,JOB_STATE_DONE,JOB_STATE_ERROR
+        from hyperopt.utils import coarse_utcnow
+        trials = Trials()
+        domain = Domain(self,self.hyperparameter_space)
+        rstate = np.random.default_rng(self.seed)
+        running = {}
+        ctx = multiprocessing.get_context('spawn')
+        manager = ctx.Manager() if self.asha is not None else None
+        asha = self.make_asha(rungs=manager.dict(),lock=manager.Lock()) if manager is not None else None
+        budget = self.hyperits*self.total_epochs
+        spent = 0.
+        def can_submit():
+            if asha is None:
+                return len(trials.trials)<self.hyperits
+            return spent+(len(running)+1)*self.total_epochs<=budget
+        with ProcessPoolExecutor(max_workers=workers,mp_context=ctx,initializer=_init_worker,
+                                 initargs=(self.job_param,self.hyper_param_space,threads_per_worker,asha)) as pool:
+            while can_submit() or running:
+                while len(running)<workers and can_submit():
+                    new_ids = trials.new_trial_ids(1)
+                    trials.refresh()
+                    docs = tpe.suggest(new_ids,domain,trials,rstate.integers(2**31-1))
+                    trials.insert_trial_docs(docs)
+                    trials.refresh()
+                    doc = [el for el in trials._dynamic_trials if el['tid']==new_ids[0]][0]
+                    doc['state'] = JOB_STATE_RUNNING
+                    params = space_eval(self.hyperparameter_space,{k:v[0] for k,v in doc['misc']['vals'].items() if v})
+                    running[pool.submit(_run_trial,doc['tid'],params)] = doc
+                done,_ = wait(running,return_when=FIRST_COMPLETED)
+                for future in done:
+                    doc = running.pop(future)
+                    try:
+                        doc['result'] = future.result()
+                        doc['state'] = JOB_STATE_DONE
+                    except Exception as e:
+                        print(f'trial {doc["tid"]} failed: {e}')
+                        doc['result'] = {'status':STATUS_FAIL,'failure':repr(e)}
+                        doc['state'] = JOB_STATE_ERROR
+                    doc['refresh_time'] = coarse_utcnow()
+                    spent += doc['result'].get('epochs',self.total_epochs)
+                trials.refresh()
+        if manager is not None:
+            manager.shutdown()
+        print(space_eval(self.hyperparameter_space,trials.argmin))
+        pickle.dump(trials,
+                    open(self.save_path + 'hyperopt_database.p',
+                         "wb"))
+
     def post_process(self):
         trials = pickle.load(open(self.save_path + 'hyperopt_database.p',
                          "rb"))
@@ -8,6 +8,7 @@ import os
 import pickle
 import numpy as np
 from utils.dataloaders import custom_dataloader
+from utils.checkpoints import checkpoint_manager
 from pycox_local.pycox.evaluation import EvalSurv
 from torch.utils.tensorboard import SummaryWriter
 from tqdm import tqdm
@@ -117,11 +118,14 @@ class hyperopt_training():
         self.chunks = job_param['chunks']
         self.max_series_accumulation = job_param['max_series_accumulation']
         self.validate_train = job_param['validate_train']
+        self.gwi_sampler = job_param.get('gwi_sampler','cholesky')
+        self.apq_estimator = job_param.get('apq_estimator','eig')
         self.global_hyperit = 0
         self.best = np.inf
         self.debug = False
         #torch.cuda.set_device(self.device)
         self.custom_dataloader = custom_dataloader
+        self.checkpoints = checkpoint_manager()
         self.save_path = f'{self.savedir}/{self.dataset_string}_seed={self.seed}_fold_idx={self.fold_idx}_objective={self.objective}_{self.net_type}/'
         if not os.path.exists(self.save_path):
             os.makedirs(self.save_path)
@@ -234,7 +238,9 @@ class hyperopt_training():
             r=self.r,
             sigma=1.0,
             reg=parameters_in['reg'],
-            x_s=parameters_in['x_s']
+            x_s=parameters_in['x_s'],
+            sampler=self.gwi_sampler,
+            apq_estimator=self.apq_estimator
         ).to(self.device)
 
         self.dump_model()
@@ -244,6 +250,7 @@ class hyperopt_training():
                                                                     min_lr=1e-3, factor=0.9)
         results = self.full_loop()
         del self.optimizer
+        self.checkpoints.flush()
         self.global_hyperit += 1
         results['net_init_params'] = net_init_params
         torch.cuda.empty_cache()
@@ -349,12 +356,14 @@ class hyperopt_training():
         return self.eval_loop(self.grid_size)
 
     def dump_model(self):
-        torch.save(self.model.state_dict(), self.save_path + f'best_model_{self.global_hyperit}.pt')
-        torch.save(self.model, self.save_path + f'best_model_full_{self.global_hyperit}.pt')
+        self.checkpoints.save(self.model, self.save_path + f'best_model_{self.global_hyperit}.pt')
 
+    def dump_full_model(self):
+        # pickles the whole module once per trial, after the best weights are restored
+        torch.save(self.model, self.save_path + f'best_model_full_{self.global_hyperit}.pt')
 
     def load_model(self):
-        self.model.load_state_dict(torch.load(self.save_path + f'best_model_{self.global_hyperit}.pt'))
+        self.checkpoints.restore(self.model, self.save_path + f'best_model_{self.global_hyperit}.pt')
 
     def full_loop(self):
         self.counter = 0
@@ -367,6 +376,7 @@ class hyperopt_training():
         if self.debug:
             print(f'best test ibs {min(self.debug_list)}')
         self.load_model()
+        self.dump_full_model()
         val_likelihood, val_conc, val_ibs, val_inll = self.validation_score()
         test_likelihood, test_conc, test_ibs, test_inll = self.test_score()
 
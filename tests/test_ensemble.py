@@ -0,0 +1,73 @@
+import pytest
+import torch
+from nets.nets import get_objective
+from nets.ensemble import survival_net_ensemble
+
+
+def _net_init_params(cat_size_list, objective, direct_dif):
+    return {
+        'd_in_x': 3,
+        'cat_size_list': cat_size_list,
+        'd_in_y': 1,
+        'd_out': 1,
+        'bounding_op': torch.relu,
+        'transformation': torch.tanh,
+        'layers_x': [8, 8],
+        'layers_t': [1],
+        'layers': [8, 8],
+        'direct_dif': direct_dif,
+        'objective': objective,
+        'dropout': 0.,
+        'eps': 1e-3,
+    }
+
+
+def _member_data(K, n, cat_size_list):
+    X = torch.randn(K, n, 3)
+    y = torch.rand(K, n, 1)
+    delta = torch.randint(0, 2, (K, n)).float()
+    x_cat = torch.stack([torch.randint(0, el, (K, n)) for el in cat_size_list], -1) if cat_size_list else []
+    return X, y, delta, x_cat
+
+
+@pytest.mark.parametrize('cat_size_list', [[], [3, 5]])
+@pytest.mark.parametrize('objective', ['S_mean', 'hazard_mean'])
+@pytest.mark.parametrize('direct_dif', ['analytic', 'autograd'])
+def test_ensemble_loss_equals_member_loss(cat_size_list, objective, direct_dif):
+    torch.manual_seed(0)
+    K = 3
+    ensemble = survival_net_ensemble(_net_init_params(cat_size_list, objective, direct_dif), seeds=range(K)).eval()
+    X, y, delta, x_cat = _member_data(K, 40, cat_size_list)
+    losses = ensemble.loss(X, y, delta, x_cat)
+    train_objective = get_objective(objective)
+    for k in range(K):
+        member = ensemble.member(k).eval()
+        x_cat_k = x_cat[k] if cat_size_list else []
+        expected = train_objective(*member.forward_train(X[k], y[k], delta[k] == 1, x_cat_k))
+        assert torch.allclose(losses[k], expected, atol=1e-5)
+
+
+@pytest.mark.parametrize('cat_size_list', [[], [3, 5]])
+def test_ensemble_survival_curves_are_member_mean(cat_size_list):
+    torch.manual_seed(0)
+    K = 3
+    ensemble = survival_net_ensemble(_net_init_params(cat_size_list, 'S_mean', 'analytic'), seeds=range(K)).eval()
+    X, _, _, x_cat = _member_data(1, 25, cat_size_list)
+    x_cat = x_cat[0] if cat_size_list else []
+    time_grid = torch.linspace(0, 1, 10).unsqueeze(-1)
+    with torch.no_grad():
+        S = ensemble.forward_S_eval_grid(X[0], time_grid, x_cat)
+        expected = torch.stack([ensemble.member(k).eval().forward_S_eval_grid(X[0], time_grid, x_cat)
+                                for k in range(K)]).mean(0)
+    assert torch.allclose(S, expected, atol=1e-6)
+
+
+def test_ensemble_members_train_independently():
+    torch.manual_seed(0)
+    K = 2
+    ensemble = survival_net_ensemble(_net_init_params([3], 'S_mean', 'analytic'), seeds=range(K))
+    X, y, delta, x_cat = _member_data(K, 30, [3])
+    ensemble.loss(X, y, delta, x_cat)[0].backward()
+    for p in ensemble.parameters():
+        if p.grad is not None:
+            assert (p.grad[1] == 0).all()
@@ -0,0 +1,58 @@
+import pytest
+import torch
+from nets.nets import nn_node
+
+
+def _per_column_reference(node, X, x_cat):
+    # The layout nn_node had before the shared table: one Embedding per column, concatenated after X
+    cols = [torch.nn.functional.embedding(x_cat[:, i], node.cat_embedding.weight[off:off + el, :w])
+            for i, (off, el, w) in enumerate(zip(node.cat_embedding.row_offset.tolist(),
+                                                 node.cat_embedding.cat_size_list,
+                                                 node.cat_embedding.latent_col_list))]
+    return node.dropout(node.f(node.lnorm(node.w(torch.cat([X] + cols, 1)))))
+
+
+def test_nn_node_embedding_matches_per_column():
+    torch.manual_seed(0)
+    node = nn_node(4, 8, [3, 5, 2], dropout=0.).eval()
+    X = torch.randn(20, 4)
+    x_cat = torch.stack([torch.randint(0, el, (20,)) for el in [3, 5, 2]], 1)
+    assert torch.allclose(node(X, x_cat), _per_column_reference(node, X, x_cat))
+
+
+@pytest.mark.parametrize('bad', [3, -1])
+def test_nn_node_embedding_out_of_range_raises(bad):
+    node = nn_node(4, 8, [3, 5], dropout=0.)
+    x_cat = torch.tensor([[bad, 0]])
+    with pytest.raises((IndexError, RuntimeError)):
+        node(torch.randn(1, 4), x_cat)
+
+
+def test_nn_node_loads_per_column_state_dict():
+    torch.manual_seed(0)
+    node = nn_node(4, 8, [3, 5], dropout=0.).eval()
+    state = node.state_dict()
+    weight = state.pop('cat_embedding.weight')
+    state['embedding_0.weight'] = weight[:3, :3].clone()
+    state['embedding_1.weight'] = weight[3:8, :4].clone()
+    loaded = nn_node(4, 8, [3, 5], dropout=0.).eval()
+    loaded.load_state_dict(state)
+    X = torch.randn(10, 4)
+    x_cat = torch.stack([torch.randint(0, 3, (10,)), torch.randint(0, 5, (10,))], 1)
+    assert torch.allclose(node(X, x_cat), loaded(X, x_cat))
+
+
+@pytest.mark.parametrize('objective', ['S_mean', 'hazard_mean'])
+def test_forward_train_autograd_matches_analytic(objective):
+    from nets.nets import survival_net_basic
+    torch.manual_seed(0)
+    net = survival_net_basic(d_in_x=3, cat_size_list=[3], d_in_y=1, d_out=1, layers_x=[8, 8], layers_t=[1],
+                             layers=[8, 8], dropout=0., direct_dif='autograd', objective=objective).eval()
+    X, y = torch.randn(30, 3), torch.rand(30, 1)
+    x_cat = torch.randint(0, 3, (30, 1))
+    mask = torch.rand(30) < 0.5
+    S, f = net.forward_train(X, y, mask, x_cat)
+    net.direct = 'analytic'
+    S_analytic, f_analytic = net.forward_train(X, y, mask, x_cat)
+    assert torch.allclose(S, S_analytic, atol=1e-6)
+    assert torch.allclose(f, f_analytic, atol=1e-5)
@@ -0,0 +1,64 @@
+import os
+import threading
+import torch
+
+
+class checkpoint_manager():
+    """Keeps the best state_dict of a trial in memory and writes it to disk on a background thread.
+
+    save() takes a detached cpu copy of the state_dict and returns. The writer thread torch.saves the newest copy to a
+    temporary file and renames it into place, so readers never see a partial checkpoint, and improvements that come
+    faster than the disk only cause one write. restore() loads the in-memory copy, flush() blocks until the newest
+    copy is on disk and re-raises write errors.
+    """
+    def __init__(self):
+        self.state = None
+        self.path = None
+        self.pending = None
+        self.writing = False
+        self.error = None
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self._writer, daemon=True)
+        self.thread.start()
+
+    def save(self, model, path):
+        state = {k: v.detach().to('cpu', copy=True) for k, v in model.state_dict().items()}
+        with self.cond:
+            self.state, self.path = state, path
+            self.pending = (state, path)
+            self.cond.notify_all()
+
+    def restore(self, model, path):
+        if self.state is not None and self.path == path:
+            model.load_state_dict(self.state)
+        else:
+            model.load_state_dict(torch.load(path))
+
+    def flush(self):
+        with self.cond:
+            while self.pending is not None or self.writing:
+                self.cond.wait()
+            error, self.error = self.error, None
+        if error is not None:
+            raise error
+
+    def _writer(self):
+        while True:
+            with self.cond:
+                while self.pending is None:
+                    self.cond.wait()
+                state, path = self.pending
+                self.pending = None
+                self.writing = True
+            error = None
+            try:
+                tmp = f'{path}.tmp'
+                torch.save(state, tmp)
+                os.replace(tmp, path)
+            except Exception as e:
+                error = e
+            with self.cond:
+                self.writing = False
+                if error is not None:
+                    self.error = error
+                self.cond.notify_all()
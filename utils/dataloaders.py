@@ -10,8 +10,14 @@ from sklearn.model_selection import train_test_split
 from sklearn.model_selection import StratifiedKFold
 import pandas as pd
 from sklearn.base import BaseEstimator, TransformerMixin
-from lifelines import KaplanMeierFitter
 import pycox_local.pycox.utils as utils
+import queue
+import threading
+import os
+import pickle
+import shutil
+import hashlib
+import inspect
 
 def calc_km(durations,events):
     km = utils.kaplan_meier(durations, 1 - events)
@@ -55,9 +61,20 @@ pd.set_option('display.width', 1000)
 
 
 class survival_dataset(Dataset):
-    def __init__(self,str_identifier,seed=1337,fold_idx=0,sumo_net=True):
+    #With cache_dir the preprocessed splits and fitted mappers are stored on disk under a key of
+    #(str_identifier, seed, fold_idx, sumo_net, preprocessing_hash()) and later instances memory map them instead of
+    #refitting. The hash covers the source of this class, so editing the preprocessing writes a new cache.
+    #The validation split is drawn without a seed, so for a given key the first split written is reused.
+    cache_fields = ['X','y','delta','times']
+    cache_attributes = ['x_mapper','duration_mapper','duration_mapper_2','cat_cols','unique_cat_cols','event_col','duration_col']
+
+    def __init__(self,str_identifier,seed=1337,fold_idx=0,sumo_net=True,cache_dir=None):
         print('fold_idx: ', fold_idx)
         super(survival_dataset, self).__init__()
+        if cache_dir is not None:
+            cache_path = os.path.join(cache_dir,f'{str_identifier}_seed={seed}_fold_idx={fold_idx}_sumo_net={sumo_net}_{preprocessing_hash()}')
+            if os.path.exists(cache_path) and self.load_cache(cache_path):
+                return
         if str_identifier=='support':
             data = support
             cont_cols = ['x0','x3','x7','x8','x9','x10','x11','x12','x13']
@@ -177,14 +194,53 @@ class survival_dataset(Dataset):
         self.split(X=x_val,delta=df_val[self.event_col],y=y_val,mode='val',cat=cat_cols,df=df_val)
         self.split(X=x_test,delta=df_test[self.event_col],y=y_test,mode='test',cat=cat_cols,df=df_test)
         self.set('train')
+        if cache_dir is not None:
+            self.save_cache(cache_path)
+
+    def cache_arrays(self):
+        fields = self.cache_fields+['cat_X'] if self.cat_cols else self.cache_fields
+        arrays = {f'{mode}_{field}':getattr(self,f'{mode}_{field}').numpy() for mode in ['train','val','test'] for field in fields}
+        for mode in ['train','val','test']:
+            arrays[f'y_{mode}_ref'] = getattr(self,f'y_{mode}_ref')
+        return arrays
+
+    def save_cache(self,cache_path):
+        #Written to a temporary directory and renamed, so concurrent jobs never see a partial cache
+        tmp_path = f'{cache_path}.tmp{os.getpid()}'
+        os.makedirs(tmp_path,exist_ok=True)
+        for name,array in self.cache_arrays().items():
+            np.save(os.path.join(tmp_path,f'{name}.npy'),array)
+        with open(os.path.join(tmp_path,'attributes.pkl'),'wb') as f:
+            attributes = {name:getattr(self,name) for name in self.cache_attributes}
+            attributes['preprocessing_hash'] = preprocessing_hash()
+            pickle.dump(attributes,f,pickle.HIGHEST_PROTOCOL)
+        try:
+            os.rename(tmp_path,cache_path)
+        except OSError: #another job wrote the same cache first
+            shutil.rmtree(tmp_path)
+
+    def load_cache(self,cache_path):
+        '''Loads the cache at cache_path, returns False without loading if it was written by other preprocessing code.'''
+        with open(os.path.join(cache_path,'attributes.pkl'),'rb') as f:
+            attributes = pickle.load(f)
+        if attributes.pop('preprocessing_hash',None)!=preprocessing_hash():
+            print(f'ignoring stale dataset cache {cache_path}')
+            return False
+        for name,value in attributes.items():
+            setattr(self,name,value)
+        fields = self.cache_fields+['cat_X'] if self.cat_cols else self.cache_fields
+        for mode in ['train','val','test']:
+            for field in fields:
+                array = np.load(os.path.join(cache_path,f'{mode}_{field}.npy'),mmap_mode='c')
+                setattr(self,f'{mode}_{field}',torch.from_numpy(array))
+            setattr(self,f'y_{mode}_ref',np.load(os.path.join(cache_path,f'y_{mode}_ref.npy'),mmap_mode='c'))
+        self.set('train')
+        return True
 
 
     def split(self,X,delta,y,cat=[],mode='train',df=[]):
         min_dur,max_dur = y.min(),y.max()
         times = np.linspace(min_dur,max_dur,100)
-        d = delta.values
-        kmf = KaplanMeierFitter()
-        kmf.fit(y,1-delta)
         setattr(self,f'{mode}_times', torch.from_numpy(times.astype('float32')).float().unsqueeze(-1))
         setattr(self,f'{mode}_delta', torch.from_numpy(delta.astype('float32').values).float())
         setattr(self,f'{mode}_y', torch.from_numpy(y).float())
@@ -222,8 +278,16 @@ class survival_dataset(Dataset):
     def __len__(self):
         return self.X.shape[0]
 
+def preprocessing_hash():
+    #Version of the cached splits: any edit to survival_dataset (columns, mappers, splitting) changes it
+    return hashlib.sha1(inspect.getsource(survival_dataset).encode()).hexdigest()[:12]
+
 class chunk_iterator():
-    def __init__(self,X,delta,y,cat_X,shuffle,batch_size):
+    #Keeps the epoch permutation as indices and gathers every batch lazily in get_batch, so starting an epoch is O(1)
+    #and no permuted copy of the dataset is made. With pin_memory (only used when CUDA is available) every batch is
+    #gathered straight into its own pinned tensors, which come from torch's caching pinned allocator, so a batch stays
+    #valid while later batches are gathered and can be moved with a non blocking .to.
+    def __init__(self,X,delta,y,cat_X,shuffle,batch_size,pin_memory=False):
         self.X = X
         self.delta = delta
         self.y = y
@@ -231,47 +295,125 @@ class chunk_iterator():
         self.shuffle = shuffle
         self.batch_size = batch_size
         self.n = self.X.shape[0]
-        self.chunks=self.n//batch_size+1
-        self.perm = torch.randperm(self.n)
+        self.chunks = (self.n+batch_size-1)//batch_size
+        self.perm = torch.randperm(self.n) if self.shuffle else None
         self.valid_cat = not isinstance(self.cat_X, list)
-        if self.shuffle:
-            self.X = self.X[self.perm,:]
-            self.delta = self.delta[self.perm]
-            self.y = self.y[self.perm,:]
-            if self.valid_cat: #F
-                self.cat_X = self.cat_X[self.perm,:]
+        self.pin_memory = pin_memory and torch.cuda.is_available()
         self._index = 0
-        self.it_X = torch.chunk(self.X,self.chunks)
-        self.it_delta = torch.chunk(self.delta,self.chunks)
-        self.it_y = torch.chunk(self.y,self.chunks)
-        if self.valid_cat:  # F
-            self.it_cat_X = torch.chunk(self.cat_X,self.chunks)
+
+    def tensors(self):
+        if self.valid_cat:
+            return [self.X,self.cat_X,self.y,self.delta]
+        return [self.X,self.y,self.delta]
+
+    def pinned_like(self,t,rows):
+        return torch.empty((rows,)+t.shape[1:],dtype=t.dtype,pin_memory=True)
+
+    def get_batch(self,i):
+        '''Returns batch i of the epoch, (X, cat_X or [], y, delta)'''
+        start = i*self.batch_size
+        end = min(start+self.batch_size,self.n)
+        if self.perm is None:
+            batch = [t[start:end] for t in self.tensors()]
+            if self.pin_memory:
+                batch = [self.pinned_like(t,end-start).copy_(t) for t in batch]
         else:
-            self.it_cat_X = []
-        self.true_chunks = len(self.it_X)
+            idx = self.perm[start:end]
+            if self.pin_memory:
+                batch = [torch.index_select(t,0,idx,out=self.pinned_like(t,end-start)) for t in self.tensors()]
+            else:
+                batch = [t[idx] for t in self.tensors()]
+        if not self.valid_cat:
+            batch.insert(1,[])
+        return tuple(batch)
+
+    def __iter__(self):
+        return self
 
     def __next__(self):
         ''''Returns the next value from team object's lists '''
-        if self._index < self.true_chunks:
-            if self.valid_cat:
-                result = (self.it_X[self._index],self.it_cat_X[self._index],self.it_y[self._index],self.it_delta[self._index])
-            else:
-                result = (self.it_X[self._index],[],self.it_y[self._index],self.it_delta[self._index])
+        if self._index < self.chunks:
+            result = self.get_batch(self._index)
             self._index += 1
             return result
         # End of Iteration
         raise StopIteration
 
     def __len__(self):
-        return len(self.it_X)
+        return self.chunks
+
+    def close(self):
+        pass
+
+class prefetch_iterator():
+    #Prepares the batches of a chunk_iterator ahead of the training step in background threads: gather and move to
+    #the device. Worker w handles batches w, w+workers, ... into its own bounded queue, and batches are handed out in
+    #order by reading the queues round robin, so at most workers*queue_size batches are in flight.
+    def __init__(self,chunk_it,device,workers=1,queue_size=2):
+        self.chunk_it = chunk_it
+        self.device = device
+        self.workers = workers
+        self.chunks = len(chunk_it)
+        self.stop = threading.Event()
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in range(workers)]
+        self.threads = [threading.Thread(target=self.work,args=(w,),daemon=True) for w in range(workers)]
+        for t in self.threads:
+            t.start()
+        self._index = 0
+
+    def prepare(self,i):
+        X,x_cat,y,delta = self.chunk_it.get_batch(i)
+        X = X.to(self.device)
+        y = y.to(self.device)
+        delta = delta.to(self.device)
+        if not isinstance(x_cat,list):
+            x_cat = x_cat.to(self.device)
+        return X,x_cat,y,delta
+
+    def work(self,w):
+        for i in range(w,self.chunks,self.workers):
+            try:
+                item = self.prepare(i)
+            except Exception as e:
+                item = e
+            while not self.stop.is_set():
+                try:
+                    self.queues[w].put(item,timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+            if self.stop.is_set() or isinstance(item,Exception):
+                return
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._index < self.chunks:
+            result = self.queues[self._index % self.workers].get()
+            self._index += 1
+            if isinstance(result,Exception):
+                self.close()
+                raise result
+            return result
+        self.close()
+        raise StopIteration
+
+    def __len__(self):
+        return self.chunks
+
+    def close(self):
+        '''Stops the workers, needed when the epoch is left early'''
+        self.stop.set()
 
 class custom_dataloader():
-    def __init__(self,dataset,batch_size=32,shuffle=False):
+    def __init__(self,dataset,batch_size=32,shuffle=False,pin_memory=False):
         self.dataset = dataset
         self.batch_size = batch_size
         self.shuffle = shuffle
+        self.pin_memory = pin_memory
         self.n = self.dataset.X.shape[0]
-        self.len=self.n//batch_size+1
+        self.len=(self.n+batch_size-1)//batch_size
     def __iter__(self):
         return chunk_iterator(X =self.dataset.X,
                               delta = self.dataset.delta,
@@ -279,13 +421,44 @@ class custom_dataloader():
                               cat_X = self.dataset.cat_X,
                               shuffle = self.shuffle,
                               batch_size=self.batch_size,
+                              pin_memory=self.pin_memory,
                               )
     def __len__(self):
         self.n = self.dataset.X.shape[0]
-        self.len = self.n // self.batch_size + 1
+        self.len = (self.n+self.batch_size-1)//self.batch_size
         return self.len
 
-def get_dataloader(str_identifier,bs,seed,fold_idx,shuffle=True,sumo_net=False):
-    d = survival_dataset(str_identifier, seed, fold_idx=fold_idx, sumo_net=sumo_net)
-    dat = custom_dataloader(dataset=d,batch_size=bs,shuffle=shuffle)
+class prefetch_dataloader():
+    #Wraps a custom_dataloader (batch_size and shuffle are read from it at every epoch) and prefetches its batches
+    #onto device with prefetch_iterator.
+    def __init__(self,dataloader,device,workers=1,queue_size=2):
+        self.dataloader = dataloader
+        self.device = device
+        self.workers = workers
+        self.queue_size = queue_size
+
+    @property
+    def dataset(self):
+        return self.dataloader.dataset
+
+    @property
+    def batch_size(self):
+        return self.dataloader.batch_size
+
+    def __iter__(self):
+        chunk_it = chunk_iterator(X =self.dataset.X,
+                                  delta = self.dataset.delta,
+                                  y = self.dataset.y,
+                                  cat_X = self.dataset.cat_X,
+                                  shuffle = self.dataloader.shuffle,
+                                  batch_size=self.dataloader.batch_size,
+                                  )
+        return prefetch_iterator(chunk_it,self.device,self.workers,self.queue_size)
+
+    def __len__(self):
+        return len(self.dataloader)
+
+def get_dataloader(str_identifier,bs,seed,fold_idx,shuffle=True,sumo_net=False,pin_memory=False,cache_dir=None):
+    d = survival_dataset(str_identifier, seed, fold_idx=fold_idx, sumo_net=sumo_net, cache_dir=cache_dir)
+    dat = custom_dataloader(dataset=d,batch_size=bs,shuffle=shuffle,pin_memory=pin_memory)
     return dat
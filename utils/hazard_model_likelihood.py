@@ -1,8 +1,37 @@
 import torch
 import numpy as np
-from pycox_local.pycox.evaluation import EvalSurv
+from pycox_local.pycox.utils import idx_at_times
 import torchtuples as tt
 
+def interpolation_indices(times, t):
+    """Indices of the first point of the sorted grid `times` with times >= t, and of the point before it.
+    Points past the end of the grid get the last index."""
+    indices = torch.searchsorted(times, t.to(times.dtype).contiguous()).clamp_max(times.shape[0] - 1)
+    return indices, torch.relu(indices - 1)
+
+def interpolate_survival(times, surv_tensor, t):
+    """Linear interpolation of the survival curves (rows of `surv_tensor`, on the grid `times`) at t,
+    and the density given by the slope of the interpolated segment."""
+    indices, base_ind = interpolation_indices(times, t)
+    S_t_1 = torch.gather(surv_tensor, dim=1, index=indices)
+    S_t_0 = torch.gather(surv_tensor, dim=1, index=base_ind)
+    delta = times[indices] - times[base_ind]
+    t_prime = t - times[base_ind]
+    S = (1 - t_prime / delta) * S_t_0 + t_prime / delta * S_t_1
+    f = -(S_t_1 - S_t_0) / delta
+    return S, f
+
+def unique_survival_rows(surv, chunk_size=10000):
+    """Mask of the rows of `surv` [n_times, n] that differ from the row before, computed over column chunks.
+    Survival curves are monotone in time, so repeated rows are consecutive and this is the same as
+    drop_duplicates(keep='first') on the rows."""
+    keep = np.zeros(surv.shape[0], dtype=bool)
+    keep[0] = True
+    for lo in range(0, surv.shape[1], chunk_size):
+        block = surv[:, lo:lo + chunk_size]
+        keep[1:] |= (block[1:] != block[:-1]).any(1)
+    return keep
+
 class ApproximateLikelihood:
     '''
     Enter a model, covariates, times and events
@@ -12,10 +41,12 @@ class ApproximateLikelihood:
     d: 1d numpy array
     baseline_sample_size: how many samples to compute the the baseline hazard
     half_width: k >=1 and densities are evaluated using T_{i-k+1} and T_{i+k}
+    chunk_size: number of individuals per chunk when looking for repeated time points
     '''
 
-    def __init__(self, model, x, t, d, baseline_sample_size, half_width,dataset):
+    def __init__(self, model, x, t, d, baseline_sample_size, half_width,dataset,chunk_size=10000):
         self.ds=dataset
+        self.chunk_size = chunk_size
         self.model = model
         self.t = t
         self.d = d
@@ -42,43 +73,44 @@ class ApproximateLikelihood:
 
         return None
 
-    def get_densities(self,surv_df_raw=None):
-
-        # Get the survival dataframe for x_observed, drop duplicate rows
+    def get_survival_array(self, mask, surv_df_raw=None):
+        # Times and [n_times, n] survival array of the individuals in mask, without repeated time points
         if surv_df_raw is None:
             if isinstance(self.x,tuple):
-                input= tt.tuplefy((self.x[0][self.mask_observed], self.x[1][self.mask_observed]))
+                input= tt.tuplefy((self.x[0][mask], self.x[1][mask]))
             else:
-                input = self.x[self.mask_observed]
-            survival_df_observed = self.model.predict_surv_df(input).drop_duplicates(keep='first')
+                input = self.x[mask]
+            surv_df = self.model.predict_surv_df(input)
+            times, surv = surv_df.index.values, surv_df.values
         else:
-            np_bool = self.mask_observed
-            survival_df_observed = surv_df_raw[np_bool].transpose().drop_duplicates(keep='first')
+            times, surv = surv_df_raw.columns.values, surv_df_raw.values[mask].T
+        keep = unique_survival_rows(surv, self.chunk_size)
+        return times[keep], surv[keep]
 
-        assert survival_df_observed.index.is_monotonic
-        min_index, max_index = 0, len(survival_df_observed.index.values) - 1
+    def get_densities(self,surv_df_raw=None):
+
+        # Get the survival array for x_observed, drop duplicate rows
+        times, surv = self.get_survival_array(self.mask_observed, surv_df_raw)
+        min_index, max_index = 0, len(times) - 1
 
-        # Create an Eval object
-        eval_observed = EvalSurv(survival_df_observed, self.t[self.mask_observed], self.d[self.mask_observed])
-        # Get the indices of the survival_df
-        indices = eval_observed.idx_at_times(self.t[self.mask_observed])
+        # Get the indices of the survival array
+        indices = idx_at_times(times, self.t[self.mask_observed], 'post')
 
-        left_index = np.minimum(np.maximum(indices - self.half_width + 1, min_index), max_index - 1).squeeze()
-        right_index = np.minimum(indices + self.half_width, max_index).squeeze()
+        left_index = np.minimum(np.maximum(indices - self.half_width + 1, min_index), max_index - 1)
+        right_index = np.minimum(indices + self.half_width, max_index)
 
         # Get the survival probabilities and times
-        left_survival = np.array([survival_df_observed.iloc[left_index[i], i] for i in range(len(left_index))])
-        right_survival = np.array([survival_df_observed.iloc[right_index[i], i] for i in range(len(right_index))])
+        cols = np.arange(len(indices))
+        left_survival = surv[left_index, cols]
+        right_survival = surv[right_index, cols]
 
         #Rescaling procedure should occur here:
 
-        old_time_scale = np.array(survival_df_observed.index)
-        original_scale = self.ds.duration_mapper.inverse_transform(old_time_scale.reshape(-1, 1))
-        zero_one_scale = self.ds.duration_mapper_2.transform(original_scale.reshape(-1, 1))
-        survival_df_observed.index = zero_one_scale.squeeze()
+        original_scale = self.ds.duration_mapper.inverse_transform(np.array(times).reshape(-1, 1))
+        zero_one_scale = self.ds.duration_mapper_2.transform(original_scale.reshape(-1, 1)).squeeze()
 
-        left_time = np.array(survival_df_observed.index[left_index])
-        right_time = np.array(survival_df_observed.index[right_index])
+        left_time = zero_one_scale[left_index]
+        right_time = zero_one_scale[right_index]
 
         # Approximate the derivative
         delta_survival = left_survival - right_survival
@@ -89,23 +121,14 @@ class ApproximateLikelihood:
 
     def get_survival(self,surv_df_raw=None):
 
-        # Create the survival_df and the Eval object
-        if surv_df_raw is None:
-            if isinstance(self.x,tuple):
-                input= tt.tuplefy((self.x[0][~self.mask_observed], self.x[1][~self.mask_observed]))
-            else:
-                input = self.x[~self.mask_observed]
-            survival_df_censored = self.model.predict_surv_df(input).drop_duplicates(keep='first')
-        else:
-            np_bool = ~self.mask_observed
-            survival_df_censored = surv_df_raw[np_bool].transpose().drop_duplicates(keep='first')
-        eval_censored = EvalSurv(survival_df_censored, self.t[~self.mask_observed], self.d[~self.mask_observed])
+        # Create the survival array of the censored
+        times, surv = self.get_survival_array(~self.mask_observed, surv_df_raw)
 
-        # Get a list of indices of the censored times
-        indices = eval_censored.idx_at_times(self.t[~self.mask_observed]).squeeze()
+        # Get the indices of the censored times
+        indices = idx_at_times(times, self.t[~self.mask_observed], 'post')
 
         # Select the survival probabilities
-        self.survival = np.array([survival_df_censored.iloc[indices[i], i] for i in range(len(indices))])
+        self.survival = surv[indices, np.arange(len(indices))]
 
         return self.survival
 
@@ -147,22 +170,13 @@ class HazardLikelihoodCoxTime():
         return haz_vec
 
     def get_base(self, t):
-        bool_mask = t <=self.base_haz_time_cum
-        idx = torch.arange(bool_mask.shape[1], 0, -1)
-        tmp2 = bool_mask * idx
-        indices = torch.argmax(tmp2, 1, keepdim=True)
-        base_ind = torch.relu(indices - 1)
+        indices, base_ind = interpolation_indices(self.base_haz_time_cum, t)
         S_t_1 = self.base_haz_cum[indices]
         S_t_0 = self.base_haz_cum[base_ind]
         delta = self.base_haz_time_cum[indices] - self.base_haz_time_cum[base_ind]
         haz_vec = (S_t_1 - S_t_0) / delta
         return haz_vec
 
-    def get_vec_base(self, t):
-        bool_mask = t >= self.base_haz_time
-        tmp2 = bool_mask * self.base_haz  # Might have to refine this step later
-        return tmp2
-
     def get_base_haz_interpolate(self, t):
         haz_vec = self.get_base(t)
         haz_vec = self.check_min(t, haz_vec)
@@ -186,17 +200,24 @@ class HazardLikelihoodCoxTime():
         return hazard
 
     def calculate_cumulative_hazard(self, X, T):
+        # sum_j 1{base_haz_time_j <= t} base_haz_j exp(g(x, base_haz_time_j)). Without time in g this is exp(g(x))
+        # times the cumulative baseline at t, otherwise g is only evaluated at the nonzero baseline hazards up to t.
         chks = X.shape[0] // 5000 + 1
         c_haz_list = []
+        nonzero = self.base_haz > 0
+        times, base_haz = self.base_haz_time[nonzero], self.base_haz[nonzero]
+        base_cum = torch.cat([torch.zeros(1), base_haz.cumsum(0)])
         for x, t in zip(torch.chunk(X, chks, dim=0), torch.chunk(T, chks, dim=0)):
-            vec_hazard = self.get_vec_base(t)
-            new_x = x.repeat_interleave(self.base_haz_time.shape[0], dim=0)
-            new_t = self.base_haz_time.repeat(x.shape[0]).unsqueeze(-1)
+            n_before = torch.searchsorted(times, t.view(-1).to(times.dtype).contiguous(), right=True)
             if self.model.__class__.__name__=='CoxTime':
-                exp_g = self.model.predict((new_x, new_t)).view(x.shape[0], -1).exp().cpu()
+                rows = torch.repeat_interleave(torch.arange(x.shape[0]), n_before)
+                start = torch.cumsum(n_before, 0) - n_before
+                cols = torch.arange(rows.shape[0]) - start[rows]
+                exp_g = self.model.predict((x[rows], times[cols].unsqueeze(-1))).view(-1).exp().cpu()
+                cum_hazard = torch.zeros(x.shape[0]).index_add_(0, rows, base_haz[cols] * exp_g)
             else:
-                exp_g = self.model.predict((new_x)).view(x.shape[0], -1).exp().cpu()
-            cum_hazard = torch.sum(vec_hazard * exp_g, dim=1)
+                exp_g = self.model.predict((x)).view(-1).exp().cpu()
+                cum_hazard = exp_g * base_cum[n_before]
             c_haz_list.append(cum_hazard)
         cum_hazard = torch.cat(c_haz_list, dim=0)
         return cum_hazard
@@ -218,6 +239,17 @@ class general_likelihood():
     def __init__(self, pycox_model):
         self.model = pycox_model
 
+    def S_and_f_chunk(self, surv_df, t, e):
+        times = torch.from_numpy(surv_df.index.values).float()
+        surv_tensor = torch.from_numpy(surv_df.values).t().float()
+        min_time = times.min().item()
+        max_time = times.max().item()
+        min_bool = (t <= min_time).squeeze()
+        max_bool = (t >= max_time).squeeze()
+        inside = torch.logical_and(~min_bool, ~max_bool)
+        S, f = interpolate_survival(times, surv_tensor[inside], t[inside])
+        return S, f, e[inside]
+
     def get_S_and_f_df(self, T, event,df):
         chks = T.shape[0] // 5000 + 1
         S_cat = []
@@ -229,26 +261,7 @@ class general_likelihood():
             tmp_df = surv_df.drop_duplicates(keep='first')
             if tmp_df.shape[0]>2:
                 surv_df=tmp_df
-            times = torch.from_numpy(surv_df.index.values).float()
-            surv_tensor = torch.from_numpy(surv_df.values).t().float()
-            min_time = times.min().item()
-            max_time = times.max().item()
-            min_bool = (t <= min_time).squeeze()
-            max_bool = (t >= max_time).squeeze()
-            surv_tensor = surv_tensor[torch.logical_and(~min_bool, ~max_bool)]
-            t = t[torch.logical_and(~min_bool, ~max_bool)]
-            e = e[torch.logical_and(~min_bool, ~max_bool)]
-            bool_mask = t <= times
-            idx = torch.arange(bool_mask.shape[1], 0, -1)
-            tmp2 = bool_mask * idx
-            indices = torch.argmax(tmp2, 1, keepdim=True)
-            base_ind = torch.relu(indices - 1)
-            S_t_1 = torch.gather(surv_tensor, dim=1, index=indices)
-            S_t_0 = torch.gather(surv_tensor, dim=1, index=base_ind)
-            delta = times[indices] - times[base_ind]
-            t_prime = t - times[base_ind]
-            S = (1 - t_prime / delta) * S_t_0 + t_prime / delta * S_t_1
-            f = -(S_t_1 - S_t_0) / delta
+            S, f, e = self.S_and_f_chunk(surv_df, t, e)
             events.append(e)
             S_cat.append(S)
             f_cat.append(f)
@@ -267,26 +280,7 @@ class general_likelihood():
         for x, t, e in zip(torch.chunk(X, chks, dim=0), torch.chunk(T, chks, dim=0), torch.chunk(event, chks, dim=0)):
             surv_df = self.model.predict_surv_df(x)
             surv_df = surv_df.drop_duplicates(keep='first')
-            times = torch.from_numpy(surv_df.index.values).float()
-            surv_tensor = torch.from_numpy(surv_df.values).t().float()
-            min_time = times.min().item()
-            min_bool = (t <= min_time).squeeze()
-            max_time = times.max().item()
-            max_bool = (t >= max_time).squeeze()
-            surv_tensor = surv_tensor[torch.logical_and(~min_bool, ~max_bool)]
-            t = t[torch.logical_and(~min_bool, ~max_bool)]
-            e = e[torch.logical_and(~min_bool, ~max_bool)]
-            bool_mask = t <= times
-            idx = torch.arange(bool_mask.shape[1], 0, -1)
-            tmp2 = bool_mask * idx
-            indices = torch.argmax(tmp2, 1, keepdim=True)
-            base_ind = torch.relu(indices - 1)
-            S_t_1 = torch.gather(surv_tensor, dim=1, index=indices)
-            S_t_0 = torch.gather(surv_tensor, dim=1, index=base_ind)
-            delta = times[indices] - times[base_ind]
-            t_prime = t - times[base_ind]
-            S = (1 - t_prime / delta) * S_t_0 + t_prime / delta * S_t_1
-            f = -(S_t_1 - S_t_0) / delta
+            S, f, e = self.S_and_f_chunk(surv_df, t, e)
             events.append(e)
             S_cat.append(S)
             f_cat.append(f)